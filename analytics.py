@@ -0,0 +1,119 @@
+"""
+Analytics Module
+Per-question item analysis and score percentiles for a test
+"""
+
+import math
+from collections import Counter
+from itertools import compress
+from operator import mul
+from typing import Dict, List, Sequence
+
+from scoring import CompiledScorer, normalize_answer, row_totals
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Most common answers reported per text-question part
+TOP_TEXT_ANSWERS = 5
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Linearly interpolated percentile of pre-sorted values"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def answer_distribution(values: Sequence) -> Dict[str, int]:
+    """Count submitted answers by normalized value
+
+    Raw values are counted first so only the distinct ones are normalized.
+    A packed choice column (a str) is counted with str.count per distinct
+    character.
+    """
+    try:
+        if isinstance(values, str):
+            counts = {value: values.count(value) for value in set(values)}
+        else:
+            counts = Counter(values)
+    except TypeError:
+        # Unhashable (nested) answers where a plain one was expected
+        counts = Counter(v if not isinstance(v, (dict, list)) else None for v in values)
+
+    distribution: Dict[str, int] = {}
+    for value, count in counts.items():
+        key = normalize_answer(value) or 'unanswered'
+        distribution[key] = distribution.get(key, 0) + count
+    return distribution
+
+
+def point_biserial(correct: Sequence[int], totals: Sequence[int], sum_totals: int, sum_totals_sq: int) -> float:
+    """Correlation between one item and the rest of the test (item excluded)
+
+    correct holds one 0/1 flag per submission. sum_totals and sum_totals_sq
+    are the sum and sum of squares of totals, shared by every question of
+    the test.
+    """
+    n = len(totals)
+    n_correct = correct.count(1)
+    if n < 2 or n_correct in (0, n):
+        return 0.0
+
+    p = n_correct / n
+    sum_totals_correct = sum(compress(totals, correct))
+
+    # Rest score = total - item; item^2 == item for 0/1 flags
+    mean_rest = (sum_totals - n_correct) / n
+    mean_rest_sq = (sum_totals_sq - 2 * sum_totals_correct + n_correct) / n
+    var_rest = mean_rest_sq - mean_rest ** 2
+    if var_rest <= 0:
+        return 0.0
+
+    covariance = (sum_totals_correct - n_correct) / n - p * mean_rest
+    return covariance / math.sqrt(p * (1 - p) * var_rest)
+
+
+def compute_test_analytics(test: Dict, results: List[Dict], scorer: CompiledScorer) -> Dict:
+    """Item difficulty, discrimination and answer distributions for one test"""
+    submissions = [r['answers'] for r in results]
+    columns = scorer.columns(submissions)
+    matrix = scorer.correct_matrix(submissions, columns)
+
+    n = len(submissions)
+    totals = row_totals(matrix, n)
+    sum_totals = sum(totals)
+    sum_totals_sq = sum(map(mul, totals, totals))
+
+    questions = []
+    for question_num, is_text, correct in zip(scorer.questions, scorer.text_slots, matrix):
+        if is_text:
+            options = {part: dict(Counter(answer_distribution(
+                scorer.part_column(columns, question_num, part)
+            )).most_common(TOP_TEXT_ANSWERS)) for part in ('A', 'B')}
+        else:
+            options = answer_distribution(columns[question_num])
+
+        correct_count = correct.count(1)
+        questions.append({
+            'question': question_num,
+            'type': 'text' if is_text else 'multiple_choice',
+            'correct_count': correct_count,
+            'correct_rate': round(correct_count / n, 4) if n else 0.0,
+            'discrimination': round(point_biserial(correct, totals, sum_totals, sum_totals_sq), 4),
+            'options': options
+        })
+
+    scores = sorted(r['score'] for r in results)
+    return {
+        'test_code': test['code'],
+        'title': test.get('title'),
+        'submissions': n,
+        'average_score': round(sum(scores) / n, 1) if n else 0.0,
+        'score_percentiles': {f'p{p}': round(percentile(scores, p), 1) for p in PERCENTILES},
+        'questions': questions
+    }
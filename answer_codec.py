@@ -0,0 +1,233 @@
+"""
+Answer Codec Module
+Packs submitted answers into compact rows laid out by the shared answer sheet
+"""
+
+import json
+from itertools import compress, repeat
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Answer sheet layout shared by every test: (first, last, question type, choices or parts)
+QUESTION_LAYOUT = (
+    (1, 32, 'choice', ['A', 'B', 'C', 'D']),
+    (33, 35, 'choice', ['A', 'B', 'C', 'D', 'E', 'F']),
+    (36, 45, 'text', ['A', 'B'])
+)
+
+# Version tag leading every encoded row; rows without it are legacy JSON answers
+FORMAT_PREFIX = '1:'
+
+# Choice slot value for an unanswered question; normalizes to '' like None
+MISSING = ' '
+# Separates text parts in a row, and the overflow JSON from the row
+PART_SEPARATOR = '|'
+OVERFLOW_SEPARATOR = '\n'
+
+
+def _slot_numbers(kind: str) -> List[str]:
+    """Question numbers of one type, in sheet order"""
+    return [str(number) for first, last, question_kind, _ in QUESTION_LAYOUT if question_kind == kind
+            for number in range(first, last + 1)]
+
+
+# Question number -> slot index, for one-character choice slots and two-part text slots
+CHOICE_SLOTS: Dict[str, int] = {number: slot for slot, number in enumerate(_slot_numbers('choice'))}
+TEXT_SLOTS: Dict[str, int] = {number: slot for slot, number in enumerate(_slot_numbers('text'))}
+CHOICE_WIDTH = len(CHOICE_SLOTS)
+TEXT_PARTS = ('A', 'B')
+PACKABLE_CHOICES = frozenset(choice for _, _, kind, choices in QUESTION_LAYOUT if kind == 'choice'
+                             for choice in choices)
+
+BLANK_CHOICES = MISSING * CHOICE_WIDTH
+BLANK_PARTS = PART_SEPARATOR * (len(TEXT_SLOTS) * len(TEXT_PARTS) - 1)
+
+
+def _packable_parts(value: Any) -> bool:
+    """Whether a text answer fits its slot exactly: a non-empty dict of non-empty plain strings"""
+    return (isinstance(value, dict) and bool(value) and set(value) <= set(TEXT_PARTS)
+            and all(type(part) is str and part and PART_SEPARATOR not in part and OVERFLOW_SEPARATOR not in part
+                    for part in value.values()))
+
+
+class PackedAnswers:
+    """One submission's answers as a single string row
+
+    The row holds one character per choice question (MISSING if unanswered)
+    followed by every text part joined with PART_SEPARATOR. Anything the
+    row can't represent exactly (other values, flat "36A" keys, unknown
+    questions) is kept in extra, so decoding always gives back the
+    submitted dict. Reads go through get() or to_dict(); bulk readers use
+    packed_columns() instead.
+    """
+
+    __slots__ = ('row', 'extra')
+
+    def __init__(self, row: str, extra: Optional[Dict] = None):
+        self.row = row
+        self.extra = extra or None
+
+    @classmethod
+    def pack(cls, answers: Dict) -> 'PackedAnswers':
+        """Pack a submitted answers dict"""
+        choices = [MISSING] * CHOICE_WIDTH
+        parts = [''] * (len(TEXT_SLOTS) * len(TEXT_PARTS))
+        extra = {}
+        for question_num, value in answers.items():
+            slot = CHOICE_SLOTS.get(question_num)
+            if slot is not None and type(value) is str and value in PACKABLE_CHOICES:
+                choices[slot] = value
+                continue
+            slot = TEXT_SLOTS.get(question_num)
+            if slot is not None and _packable_parts(value):
+                parts[slot * 2] = value.get('A', '')
+                parts[slot * 2 + 1] = value.get('B', '')
+                continue
+            extra[question_num] = value
+        return cls(''.join(choices) + PART_SEPARATOR.join(parts), extra)
+
+    @classmethod
+    def loads(cls, encoded: str) -> 'PackedAnswers':
+        """Parse a stored row"""
+        row, _, extra = encoded[len(FORMAT_PREFIX):].partition(OVERFLOW_SEPARATOR)
+        return cls(row, json.loads(extra) if extra else None)
+
+    def dumps(self) -> str:
+        """Row as stored"""
+        encoded = FORMAT_PREFIX + self.row
+        if self.extra:
+            encoded += OVERFLOW_SEPARATOR + json.dumps(self.extra, ensure_ascii=False, separators=(',', ':'))
+        return encoded
+
+    def _text(self, slot: int) -> Optional[Dict[str, str]]:
+        parts = self.row[CHOICE_WIDTH:].split(PART_SEPARATOR)
+        value = {part: text for part, text in zip(TEXT_PARTS, parts[slot * 2:slot * 2 + 2]) if text}
+        return value or None
+
+    def get(self, question_num: str, default: Any = None) -> Any:
+        """One answer field, as dict.get would return it from the decoded answers"""
+        if self.extra and question_num in self.extra:
+            return self.extra[question_num]
+        slot = CHOICE_SLOTS.get(question_num)
+        if slot is not None:
+            value = self.row[slot]
+            return default if value == MISSING else value
+        slot = TEXT_SLOTS.get(question_num)
+        if slot is not None:
+            value = self._text(slot)
+            return default if value is None else value
+        return default
+
+    def to_dict(self) -> Dict:
+        """The submitted answers"""
+        answers: Dict[str, Any] = {}
+        for question_num, value in zip(CHOICE_SLOTS, self.row):
+            if value != MISSING:
+                answers[question_num] = value
+        parts = self.row[CHOICE_WIDTH:].split(PART_SEPARATOR)
+        for slot, question_num in enumerate(TEXT_SLOTS):
+            value = {part: text for part, text in zip(TEXT_PARTS, parts[slot * 2:slot * 2 + 2]) if text}
+            if value:
+                answers[question_num] = value
+        if self.extra:
+            answers.update(self.extra)
+        return answers
+
+    def __bool__(self) -> bool:
+        return bool(self.extra) or self.row != BLANK_CHOICES + BLANK_PARTS
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, PackedAnswers):
+            return self.row == other.row and self.extra == other.extra
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"PackedAnswers({self.dumps()!r})"
+
+
+def encode_answers(answers: Any) -> str:
+    """Stored form of submitted or already packed answers"""
+    if not isinstance(answers, PackedAnswers):
+        answers = PackedAnswers.pack(answers or {})
+    return answers.dumps()
+
+
+def decode_answers(stored: Any) -> PackedAnswers:
+    """Packed answers from a stored row, a legacy JSON string or a legacy dict"""
+    if isinstance(stored, PackedAnswers):
+        return stored
+    if isinstance(stored, str):
+        if stored.startswith(FORMAT_PREFIX):
+            return PackedAnswers.loads(stored)
+        stored = json.loads(stored)
+    return PackedAnswers.pack(stored or {})
+
+
+def answers_dict(answers: Any) -> Dict:
+    """Plain answers dict from packed or plain answers, for detail views and exports"""
+    if isinstance(answers, PackedAnswers):
+        return answers.to_dict()
+    return answers or {}
+
+
+def _holders(overflow: List[int], extras: List[Dict], key: str) -> Iterator[Tuple[int, Dict]]:
+    """(row index, extra) of every overflow row whose extra holds key"""
+    held = list(map(dict.__contains__, extras, repeat(key)))
+    return zip(compress(overflow, held), compress(extras, held))
+
+
+def packed_columns(rows: List[PackedAnswers], slots: List[Tuple[str, bool]]) -> Dict[Any, Sequence]:
+    """Raw answer columns for the given (question, is_text) slots across packed rows
+
+    All rows' fixed-width choice prefixes are joined into one string, so each
+    choice column is a strided slice of it (a str of one character per row).
+    All text sections are joined and split once, every row contributing the
+    same number of parts, so each part column is a strided slice of that
+    list. Text parts are keyed (question, part) like CompiledScorer.part_column's
+    memo, and read like the scorer reads a dict: nested first, else flat
+    "36A" keys. Overflow is patched in per key actually present in some
+    row's extra, touching only the rows that hold it.
+    """
+    choices = ''.join([answers.row[:CHOICE_WIDTH] for answers in rows])
+    choice_columns = [choices[slot::CHOICE_WIDTH] for slot in range(CHOICE_WIDTH)]
+    parts = PART_SEPARATOR.join([answers.row[CHOICE_WIDTH:] for answers in rows]).split(PART_SEPARATOR)
+    part_count = len(TEXT_SLOTS) * len(TEXT_PARTS)
+    part_columns = [tuple(parts[index::part_count]) for index in range(part_count)]
+
+    overflow = [index for index, answers in enumerate(rows) if answers.extra]
+    extras = [rows[index].extra for index in overflow]
+    keys = set().union(*extras)
+
+    blank = (None,) * len(rows)
+    columns: Dict[Any, Sequence] = {}
+    for question_num, is_text in slots:
+        if not is_text:
+            slot = CHOICE_SLOTS.get(question_num)
+            column = blank if slot is None else choice_columns[slot]
+            if question_num in keys:
+                column = list(column)
+                for index, extra in _holders(overflow, extras, question_num):
+                    column[index] = extra[question_num]
+            columns[question_num] = column
+            continue
+
+        slot = TEXT_SLOTS.get(question_num)
+        first, second = (blank, blank) if slot is None else part_columns[slot * 2:slot * 2 + 2]
+        for column, part in zip((first, second), TEXT_PARTS):
+            flat = f"{question_num}{part}"
+            if flat in keys or question_num in keys:
+                column = list(column)
+            if flat in keys:
+                # A flat part only counts when the question has no nested answer
+                for index, extra in _holders(overflow, extras, flat):
+                    if not (first[index] or second[index]):
+                        column[index] = extra[flat]
+            if question_num in keys:
+                for index, extra in _holders(overflow, extras, question_num):
+                    nested = extra[question_num]
+                    column[index] = nested.get(part) if isinstance(nested, dict) else extra.get(flat)
+            columns[(question_num, part)] = column
+    return columns
@@ -0,0 +1,165 @@
+"""
+Static Assets Module
+Content-hashed static URLs, precompressed bodies and conditional responses
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from typing import Any, Dict
+
+from flask import Flask, Response, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Optional: without it assets are served gzip-compressed only
+    brotli = None
+
+# Cache lifetime for URLs carrying the current content hash
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Smaller files aren't worth compressing
+MIN_COMPRESS_SIZE = 512
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class Asset:
+    """One static file or serialized payload held in memory with its precompressed variants"""
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.variants: Dict[str, bytes] = {'identity': body}
+
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+
+    def pick_encoding(self, accept_encoding: str) -> str:
+        """Smallest variant the client accepts"""
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return 'identity'
+
+    @property
+    def body(self) -> bytes:
+        """Uncompressed content"""
+        return self.variants['identity']
+
+    def respond(self, cache_control: str) -> Response:
+        """Best variant for the current request, or 304 if the client's copy is current"""
+        encoding = self.pick_encoding(request.headers.get('Accept-Encoding', ''))
+        etag = self.digest if encoding == 'identity' else f"{self.digest}-{encoding}"
+
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class StaticAssets:
+    """Serves the static folder from memory with hashed URLs and far-future caching
+
+    url_for('static', ...) gains a ?v=<content hash> parameter, so a
+    changed file gets a new URL. Requests carrying the current hash are
+    cacheable for a year; anything else must revalidate via ETag.
+    """
+
+    def __init__(self, app: Flask):
+        self.static_folder = app.static_folder
+        self.assets: Dict[str, Asset] = {}
+        self._load()
+        # Digest over every asset, for pages that embed asset URLs
+        combined = ''.join(f"{name}:{asset.digest}" for name, asset in sorted(self.assets.items()))
+        self.version = hashlib.sha256(combined.encode()).hexdigest()[:12]
+
+        app.view_functions['static'] = self.serve
+        app.url_defaults(self._add_version)
+        app.extensions['static_assets'] = self
+
+    def _load(self):
+        """Read, hash and compress every static file"""
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                with open(path, 'rb') as f:
+                    self.assets[filename] = Asset(f.read(), mimetype)
+
+    def _add_version(self, endpoint: str, values: Dict[str, Any]):
+        if endpoint == 'static' and 'v' not in values:
+            asset = self.assets.get(values.get('filename', ''))
+            if asset is not None:
+                values['v'] = asset.digest
+
+    def serve(self, filename: str) -> Response:
+        """Static file view replacing Flask's default"""
+        asset = self.assets.get(filename)
+        if asset is None:
+            # Added after startup; serve it uncached from disk
+            return send_from_directory(self.static_folder, filename, max_age=0)
+
+        if request.args.get('v') == asset.digest:
+            return asset.respond(f"public, max-age={IMMUTABLE_MAX_AGE}, immutable")
+        return asset.respond("no-cache")
+
+
+def accepts_gzip() -> bool:
+    """Whether the current request accepts gzip-encoded responses"""
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+
+def content_etag(*parts: Any) -> str:
+    """ETag derived from the data a response is rendered from"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def conditional_response(etag: str, render, cache_control: str = "private, no-cache") -> Response:
+    """304 if the client already has this ETag, else render and tag the response
+
+    render is only called on a miss, so unchanged pages skip templating.
+    """
+    if accepts_gzip():
+        # The gzip and identity bodies are different representations
+        etag = f"{etag}-gzip"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = render()
+        if not isinstance(response, Response):
+            response = Response(response)
+        response = compress_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    """gzip a buffered text response for clients that accept it"""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+            or not accepts_gzip()):
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
@@ -0,0 +1,142 @@
+"""
+Async Data Module
+Awaitable DataManager access and event loop lag monitoring for the bot
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from analytics import percentile
+from metrics import EVENT_LOOP_LAG_MAX_SECONDS, EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Threads serving blocking DataManager calls for the bot
+DATA_WORKERS = int(os.getenv("DATA_WORKERS", "8"))
+
+# Seconds between loop lag probes
+LAG_PROBE_INTERVAL = 0.1
+# Lag above this many seconds is logged as a stall
+LAG_WARN_THRESHOLD = 0.1
+# Seconds between lag summaries in the log
+LAG_REPORT_INTERVAL = 60
+# Probes kept for percentile reporting
+LAG_WINDOW = 600
+
+
+class AsyncDataManager:
+    """Runs DataManager calls on a dedicated thread pool so handlers never block the loop"""
+
+    def __init__(self, data_manager, max_workers: int = DATA_WORKERS):
+        self.data_manager = data_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data-manager")
+
+    async def run(self, func, *args, **kwargs):
+        """Await a blocking call on the data executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_or_create_user(self, user_id: int, username: str) -> Dict:
+        """Get existing user or create new one"""
+        return await self.run(self.data_manager.get_or_create_user, user_id, username)
+
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user data"""
+        return await self.run(self.data_manager.get_user, user_id)
+
+    async def get_test_by_code(self, code: str) -> Optional[Dict]:
+        """Get test by code"""
+        return await self.run(self.data_manager.get_test_by_code, code)
+
+    async def get_tests_by_codes(self, codes: List[str]) -> Dict[str, Dict]:
+        """Get several tests by code in one lookup"""
+        return await self.run(self.data_manager.get_tests_by_codes, codes)
+
+    async def get_user_results(self, user_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """Get test results for a user"""
+        return await self.run(self.data_manager.get_user_results, user_id, limit)
+
+    async def count_user_results(self, user_id: int) -> int:
+        """Number of results a user has submitted"""
+        return await self.run(self.data_manager.count_user_results, user_id)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the executor once in-flight calls finish"""
+        self._executor.shutdown(wait=wait)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task
+
+    A probe sleeps for a fixed interval; anything beyond that interval is
+    time the loop spent running something else without yielding.
+    """
+
+    def __init__(self, interval: float = LAG_PROBE_INTERVAL, warn_threshold: float = LAG_WARN_THRESHOLD,
+                 report_interval: float = LAG_REPORT_INTERVAL):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.report_interval = report_interval
+        self.samples: List[float] = []
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start probing on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._probe())
+
+    async def stop(self):
+        """Stop probing and log a final summary"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._report()
+
+    def snapshot(self) -> Dict:
+        """Lag percentiles in milliseconds over the recent window"""
+        ordered = sorted(self.samples)
+        return {
+            'samples': len(ordered),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+            'max_ms': round(self.max_lag * 1000, 2),
+            'stalls': self.stalls
+        }
+
+    async def _probe(self):
+        last_report = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+
+            self.samples.append(lag)
+            if len(self.samples) > LAG_WINDOW:
+                del self.samples[:len(self.samples) - LAG_WINDOW]
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            EVENT_LOOP_LAG_MAX_SECONDS.set(self.max_lag)
+            if lag > self.warn_threshold:
+                self.stalls += 1
+                logger.warning(f"Event loop stalled for {lag * 1000:.0f} ms")
+
+            if now - last_report >= self.report_interval:
+                self._report()
+                last_report = now
+
+    def _report(self):
+        logger.info(f"Event loop lag: {self.snapshot()}")
@@ -3,8 +3,18 @@ Authentication and Authorization Module
 Handles admin login and session management
 """
 
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from ipaddress import ip_address, ip_network
+from typing import Dict, Optional
+from flask import Response, request, session, redirect, url_for, flash
+from werkzeug.security import check_password_hash, generate_password_hash
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -25,3 +35,186 @@ def require_admin(f):
             return redirect(url_for('admin_login'))
         return f(*args, **kwargs)
     return decorated_function
+
+
+# Bearer token accepted by the metrics endpoints; unset disables token access
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Comma-separated addresses or networks whose scrapers need no token
+METRICS_ALLOWED_IPS = tuple(ip_network(entry.strip(), strict=False)
+                            for entry in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(',')
+                            if entry.strip())
+
+
+def metrics_access_allowed(authorization: str, remote_addr: Optional[str]) -> bool:
+    """Whether a scraper presented the metrics token or comes from an allowed address"""
+    scheme, _, token = authorization.partition(' ')
+    if METRICS_TOKEN and scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), METRICS_TOKEN):
+        return True
+    try:
+        address = ip_address(remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_IPS)
+
+
+def require_metrics_access(f):
+    """Decorator for scraper endpoints: a bearer token or an allowlisted address, no session"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not metrics_access_allowed(request.headers.get('Authorization', ''), request.remote_addr):
+            if METRICS_TOKEN:
+                return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                                headers={'WWW-Authenticate': 'Bearer'})
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# Login attempts allowed in a burst, and seconds to earn back one attempt
+IP_BURST = int(os.getenv("LOGIN_IP_BURST", "10"))
+IP_REFILL_SECONDS = float(os.getenv("LOGIN_IP_REFILL_SECONDS", "6"))
+USERNAME_BURST = int(os.getenv("LOGIN_USERNAME_BURST", "5"))
+USERNAME_REFILL_SECONDS = float(os.getenv("LOGIN_USERNAME_REFILL_SECONDS", "12"))
+
+# Threads running password hashes; bounds the CPU a login burst can take
+LOGIN_WORKERS = int(os.getenv("LOGIN_WORKERS", "2"))
+# Verifications allowed to wait for a worker before new attempts are turned away
+LOGIN_MAX_PENDING = int(os.getenv("LOGIN_MAX_PENDING", "32"))
+# Seconds a request waits for its verification
+VERIFY_TIMEOUT = 10
+
+# Seconds the in-memory admin index is trusted before it is reloaded
+ADMIN_INDEX_TTL = 30
+
+# Buckets tracked per limiter; the least recently used are dropped first
+MAX_TRACKED_KEYS = 10000
+
+
+class LoginRateLimited(Exception):
+    """Raised when a client or username has no login attempts left"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many login attempts; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class LoginBusy(Exception):
+    """Raised when too many verifications are already waiting"""
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `burst` attempts at once, refilled one every `refill_seconds`"""
+
+    def __init__(self, burst: int, refill_seconds: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at)
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) / self.refill_seconds)
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until the key has an attempt available, 0 if it has one now"""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= 1 else (1 - tokens) * self.refill_seconds
+
+    def consume(self, key: str):
+        """Spend one attempt for the key"""
+        with self._lock:
+            now = time.monotonic()
+            self._buckets[key] = (self._tokens(key, now) - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+
+class LoginService:
+    """Admin authentication with rate limiting, kept off the request threads' CPU budget
+
+    Admins are served from an in-memory index. Every attempt costs a
+    token from both the client IP's and the username's bucket, and hashes
+    run on a small dedicated pool so a burst of logins queues there
+    instead of competing with submissions. Unknown usernames are checked
+    against a dummy hash of the same strength, so response time doesn't
+    reveal which usernames exist.
+    """
+
+    def __init__(self, data_manager, workers: int = LOGIN_WORKERS, max_pending: int = LOGIN_MAX_PENDING):
+        self.data_manager = data_manager
+        self.ip_limiter = TokenBucketLimiter(IP_BURST, IP_REFILL_SECONDS)
+        self.username_limiter = TokenBucketLimiter(USERNAME_BURST, USERNAME_REFILL_SECONDS)
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+        self._admins: Dict[str, Dict] = {}
+        self._admins_loaded_at = None
+        self._dummy_hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Made up front so the first unknown username isn't slower than the rest
+        self._dummy_hash()
+
+    def _admin_index(self) -> Dict[str, Dict]:
+        with self._lock:
+            now = time.monotonic()
+            if self._admins_loaded_at is None or now - self._admins_loaded_at >= ADMIN_INDEX_TTL:
+                self._admins = {admin['username']: admin for admin in self.data_manager.get_all_admins()}
+                self._admins_loaded_at = now
+            return self._admins
+
+    def _dummy_hash(self) -> str:
+        """A hash made the same way as the stored ones, for unknown usernames"""
+        admins = self._admin_index()
+        # "pbkdf2:sha256:260000$salt$hash" -> "pbkdf2:sha256:260000"
+        method = next(iter(admins.values()))['password_hash'].split('$', 1)[0] if admins else 'scrypt'
+        with self._lock:
+            if method not in self._dummy_hashes:
+                try:
+                    self._dummy_hashes[method] = generate_password_hash(secrets.token_hex(16), method=method)
+                except ValueError:
+                    self._dummy_hashes[method] = generate_password_hash(secrets.token_hex(16))
+            return self._dummy_hashes[method]
+
+    def invalidate(self):
+        """Reload admins on the next attempt"""
+        with self._lock:
+            self._admins_loaded_at = None
+
+    def authenticate(self, username: str, password: str, client_ip: str) -> Optional[Dict]:
+        """Return the admin for valid credentials, None otherwise
+
+        Raises LoginRateLimited when the IP or username is out of attempts
+        and LoginBusy when the verification queue is full.
+        """
+        username_key = username.casefold()
+        retry_after = max(self.ip_limiter.retry_after(client_ip), self.username_limiter.retry_after(username_key))
+        if retry_after > 0:
+            raise LoginRateLimited(retry_after)
+        self.ip_limiter.consume(client_ip)
+        self.username_limiter.consume(username_key)
+
+        admin = self._admin_index().get(username)
+        password_hash = admin['password_hash'] if admin else self._dummy_hash()
+
+        if not self._slots.acquire(blocking=False):
+            raise LoginBusy("Too many logins in progress")
+        try:
+            future = self._executor.submit(check_password_hash, password_hash, password)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            valid = future.result(timeout=VERIFY_TIMEOUT)
+        except FuturesTimeout:
+            raise LoginBusy("Login verification timed out") from None
+        return admin if admin and valid else None
+
+    def shutdown(self):
+        """Stop the verification pool"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+"""
+Benchmark Module
+Seeds synthetic data and measures latency, throughput and memory of the web and bot paths
+Usage: python benchmark.py [--backend json|sqlite] [--results N] [--targets ...] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from analytics import percentile
+from storage import STORAGE_BACKENDS, create_storage
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_ADMIN = "bench"
+BENCH_PASSWORD = "bench-password"
+# Dummy token in the format aiogram validates; requests never leave the process
+BENCH_BOT_TOKEN = "123456:BENCHMARK"
+# Secret the webhook benchmark configures and sends
+BENCH_WEBHOOK_SECRET = "bench-webhook-secret"
+
+# Results written to storage per batch while seeding
+SEED_BATCH = 10000
+# Submission dates are spread over this many days before now
+SEED_DAYS = 90
+
+SCENARIOS = ('submit', 'webapp', 'dashboard', 'stats', 'export')
+
+
+# Synthetic data
+def synthetic_answer_key(rng: random.Random) -> Dict:
+    """Answer key in the standard 45-question layout"""
+    key: Dict = {}
+    for question in range(1, 33):
+        key[str(question)] = rng.choice('ABCD')
+    for question in range(33, 36):
+        key[str(question)] = rng.choice('ABCDEF')
+    for question in range(36, 46):
+        key[str(question)] = {'A': str(rng.randint(1, 20)), 'B': str(rng.randint(1, 20))}
+    return key
+
+
+def synthetic_answers(rng: random.Random, answer_key: Dict, accuracy: float) -> Dict:
+    """Submission answering each question correctly with the given probability"""
+    answers: Dict = {}
+    for question, correct in answer_key.items():
+        if rng.random() < accuracy:
+            answers[question] = dict(correct) if isinstance(correct, dict) else correct
+        elif isinstance(correct, dict):
+            answers[question] = {'A': str(rng.randint(1, 20)), 'B': str(rng.randint(1, 20))}
+        else:
+            answers[question] = rng.choice('ABCDEF' if int(question) > 32 else 'ABCD')
+    return answers
+
+
+def seed(data_dir: str, backend: str, tests: int, users: int, results: int, rng: random.Random) -> Dict:
+    """Fill a fresh data directory with tests, users, results and a benchmark admin"""
+    from werkzeug.security import generate_password_hash
+    from scoring import CompiledScorer
+
+    started = time.perf_counter()
+    os.makedirs(data_dir, exist_ok=True)
+    storage = create_storage(backend, data_dir)
+    now = datetime.now()
+
+    test_records = []
+    for number in range(tests):
+        test_records.append({
+            'code': f"{100000 + number:06d}",
+            'title': f"Benchmark Test {number + 1}",
+            'description': 'Synthetic test',
+            'total_questions': 45,
+            'answer_key': synthetic_answer_key(rng),
+            'time_limit': 60,
+            'active': True,
+            'created_at': (now - timedelta(days=SEED_DAYS)).isoformat(),
+            'created_by': BENCH_ADMIN
+        })
+    for test in test_records:
+        storage.save_test(test)
+    scorers = {test['code']: CompiledScorer(test['answer_key']) for test in test_records}
+
+    # Results arrive in submission order, as they would in production
+    tests_taken: Dict[int, int] = {}
+    step = SEED_DAYS * 86400 / max(results, 1)
+    start_time = now - timedelta(days=SEED_DAYS)
+    batch: List[Dict] = []
+    for number in range(results):
+        test = test_records[rng.randrange(tests)]
+        user_id = 1 + rng.randrange(users)
+        answers = synthetic_answers(rng, test['answer_key'], rng.uniform(0.3, 0.95))
+        batch.append({
+            'id': f"{user_id}_{test['code']}_bench{number}",
+            'user_id': user_id,
+            'test_code': test['code'],
+            'answers': answers,
+            'score': scorers[test['code']].score(answers),
+            'submitted_at': (start_time + timedelta(seconds=number * step)).isoformat()
+        })
+        tests_taken[user_id] = tests_taken.get(user_id, 0) + 1
+        if len(batch) >= SEED_BATCH:
+            storage.add_results(batch)
+            batch = []
+    if batch:
+        storage.add_results(batch)
+
+    user_records = {
+        str(user_id): {
+            'id': user_id,
+            'name': f"Student {user_id}",
+            'username': f"student{user_id}",
+            'created_at': start_time.isoformat(),
+            'last_seen': now.isoformat(),
+            'tests_taken': tests_taken.get(user_id, 0)
+        }
+        for user_id in range(1, users + 1)
+    }
+    admin = {
+        'id': BENCH_ADMIN,
+        'username': BENCH_ADMIN,
+        'password_hash': generate_password_hash(BENCH_PASSWORD),
+        'created_at': now.isoformat(),
+        'role': 'super_admin'
+    }
+    if hasattr(storage, 'users_file'):
+        # One file write instead of one per user
+        storage.save_json(storage.users_file, user_records)
+        admins = storage.load_json(storage.admins_file)
+        admins[BENCH_ADMIN] = admin
+        storage.save_json(storage.admins_file, admins)
+    else:
+        for user in user_records.values():
+            storage.save_user(user)
+        storage.save_admin(admin)
+
+    return {
+        'tests': tests,
+        'users': users,
+        'results': results,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+# Measurement
+def summarize(latencies: List[float], elapsed: Optional[float] = None, errors: int = 0) -> Dict:
+    """Latency percentiles in milliseconds, plus throughput when the run's wall time is given"""
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+    if elapsed is not None:
+        summary['throughput_rps'] = round(len(ordered) / elapsed, 1) if elapsed else 0.0
+    return summary
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    kilobytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(kilobytes / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def process_tree_peak_rss_mb(pid: int) -> Optional[Dict]:
+    """Peak RSS of a live process and its descendants, from /proc (Linux only)
+
+    Forked children inherit the parent's ru_maxrss, so getrusage can't
+    measure the server; VmHWM is each process's own high-water mark.
+    """
+    parents: Dict[int, int] = {}
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat", 'rb') as f:
+                    # The command name may contain spaces; fields resume after its closing parenthesis
+                    parents[int(entry)] = int(f.read().rsplit(b')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree, frontier = [], [pid]
+    while frontier:
+        current = frontier.pop()
+        tree.append(current)
+        frontier.extend(child for child, parent in parents.items() if parent == current)
+
+    peaks = []
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status", encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            pass
+    if not peaks:
+        return None
+    return {'processes': len(peaks), 'max_process_mb': round(max(peaks), 1), 'total_mb': round(sum(peaks), 1)}
+
+
+class Workload:
+    """Request mix shared by the test client and the live server benchmarks"""
+
+    def __init__(self, data_dir: str, backend: str, rng: random.Random):
+        storage = create_storage(backend, data_dir)
+        self.tests = storage.get_all_tests()
+        self.user_count = storage.count_users()
+        self.rng = rng
+
+    def request(self, scenario: str) -> Tuple[str, str, Optional[Dict]]:
+        """(method, path, JSON body) for one request of a scenario"""
+        test = self.rng.choice(self.tests)
+        user_id = 1 + self.rng.randrange(self.user_count)
+        if scenario == 'submit':
+            answers = synthetic_answers(self.rng, test['answer_key'], self.rng.uniform(0.3, 0.95))
+            return 'POST', '/api/submit_test', {'user_id': user_id, 'test_code': test['code'], 'answers': answers}
+        if scenario == 'webapp':
+            return 'GET', f"/webapp?user_id={user_id}&test_code={test['code']}", None
+        if scenario == 'dashboard':
+            return 'GET', '/admin/dashboard', None
+        if scenario == 'stats':
+            return 'GET', '/admin/api/stats', None
+        if scenario == 'export':
+            return 'GET', f"/admin/api/export/{test['code']}?format=csv", None
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def request_count(args, scenario: str) -> int:
+    return args.export_requests if scenario == 'export' else args.requests
+
+
+# Flask test client
+def bench_test_client(args, workload: Workload) -> Dict:
+    """Drive every scenario in-process through Flask's test client"""
+    from web_app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = BENCH_ADMIN
+        session['admin_username'] = BENCH_ADMIN
+
+    report: Dict = {}
+    for scenario in args.scenarios:
+        latencies: List[float] = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(request_count(args, scenario)):
+            method, path, body = workload.request(scenario)
+            request_started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            # A WSGI server closes every response; close callbacks such as request timing depend on it
+            response.close()
+            latencies.append(time.perf_counter() - request_started)
+            errors += response.status_code >= 400
+        report[scenario] = summarize(latencies, time.perf_counter() - started, errors)
+
+        if scenario == 'submit':
+            # Time for the background writer to store everything accepted above
+            queue = app.extensions['submission_queue']
+            drain_started = time.perf_counter()
+            while queue.pending_count:
+                time.sleep(0.01)
+            report[scenario]['drain_seconds'] = round(time.perf_counter() - drain_started, 3)
+
+    app.extensions['submission_queue'].stop()
+    app.extensions['login_service'].shutdown()
+    return report
+
+
+# Live server
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 120):
+    """Block until the server accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not listen on port {port} within {timeout}s")
+
+
+def login_cookie(port: int) -> str:
+    """Session cookie for the benchmark admin"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/admin/login', body=f"username={BENCH_ADMIN}&password={BENCH_PASSWORD}",
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie', '')
+    conn.close()
+    if response.status != 302 or 'session=' not in cookie:
+        raise RuntimeError(f"Benchmark admin login failed with status {response.status}")
+    return cookie.split(';', 1)[0]
+
+
+def bench_server(args, workload: Workload, workdir: str, env: Dict) -> Dict:
+    """Drive every scenario over HTTP against main.py running as a separate process"""
+    port = free_port()
+    command = [sys.executable, os.path.join(REPO_DIR, 'main.py'), '--mode', args.server_mode, '--role', 'web',
+               '--host', '127.0.0.1', '--port', str(port), '--workers', str(args.workers)]
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    report: Dict = {'mode': args.server_mode, 'workers': args.workers, 'concurrency': args.concurrency}
+    try:
+        wait_for_port(port, process)
+        cookie = login_cookie(port)
+        lock = threading.Lock()
+
+        for scenario in args.scenarios:
+            total = request_count(args, scenario)
+            latencies: List[float] = []
+            errors = [0]
+
+            def worker(count: int):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+                local: List[float] = []
+                failed = 0
+                for _ in range(count):
+                    with lock:
+                        method, path, body = workload.request(scenario)
+                    headers = {'Cookie': cookie}
+                    payload = None
+                    if body is not None:
+                        payload = json.dumps(body)
+                        headers['Content-Type'] = 'application/json'
+                    request_started = time.perf_counter()
+                    conn.request(method, path, body=payload, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    local.append(time.perf_counter() - request_started)
+                    failed += response.status >= 400
+                conn.close()
+                with lock:
+                    latencies.extend(local)
+                    errors[0] += failed
+
+            shares = [total // args.concurrency + (i < total % args.concurrency) for i in range(args.concurrency)]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for future in [pool.submit(worker, share) for share in shares if share]:
+                    future.result()
+            report[scenario] = summarize(latencies, time.perf_counter() - started, errors[0])
+        report['peak_rss_mb'] = process_tree_peak_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return report
+
+
+# Bot handlers
+def make_recording_session():
+    """aiogram session that answers every Bot API call locally"""
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat
+
+    class RecordingSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls += 1
+            if method.__returning__ is bool:
+                return True
+            return method.__returning__.model_validate({
+                'message_id': self.calls,
+                'date': datetime.now(),
+                'chat': Chat(id=getattr(method, 'chat_id', 0) or 0, type='private'),
+                'text': getattr(method, 'text', None)
+            }, context={'bot': bot})
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b''
+
+        async def close(self):
+            pass
+
+    return RecordingSession()
+
+
+def bot_conversations(workload: Workload, count: int) -> List[List[Tuple[str, Dict]]]:
+    """Conversations of (kind, raw update) pairs covering every handler
+
+    Updates within a conversation come from one user and are fed in order,
+    so the code entry flow passes through its FSM state.
+    """
+    flows = (['start'], ['help'], ['status'], ['enter_code', 'code'], ['unknown'])
+    conversations = []
+    update_id = 0
+    while update_id < count:
+        user_id = 1 + workload.rng.randrange(workload.user_count)
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"Student {user_id}", 'username': f"student{user_id}"}
+        chat = {'id': user_id, 'type': 'private'}
+
+        conversation = []
+        for kind in flows[len(conversations) % len(flows)]:
+            message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': user}
+            if kind == 'enter_code':
+                bot_user = {'id': 123456, 'is_bot': True, 'first_name': 'Bot'}
+                update = {'update_id': update_id, 'callback_query': {
+                    'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': 'enter_code',
+                    'message': dict(message, text='menu', **{'from': bot_user})}}
+            else:
+                text = {'start': '/start', 'help': '/help', 'status': '/status',
+                        'code': workload.rng.choice(workload.tests)['code'], 'unknown': 'hello'}[kind]
+                entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}] if text.startswith('/') else []
+                update = {'update_id': update_id, 'message': dict(message, text=text, entities=entities)}
+            conversation.append((kind, update))
+            update_id += 1
+        conversations.append(conversation)
+    return conversations
+
+
+_bench_bot = None
+
+
+def bench_bot_module():
+    """The bot module on a local Bot API session, its handlers registered once for every bot target"""
+    global _bench_bot
+    if _bench_bot is None:
+        os.environ['BOT_TOKEN'] = BENCH_BOT_TOKEN
+        os.environ['FSM_STORAGE'] = 'memory'
+        os.environ.pop('TELEGRAM_API_URL', None)
+        import bot as bot_module
+
+        bot_module.init_bot()
+        session = make_recording_session()
+        bot_module.bot.session = session
+        bot_module.register_handlers()
+        _bench_bot = (bot_module, session)
+    return _bench_bot
+
+
+def bench_bot(args, workload: Workload) -> Dict:
+    """Feed synthetic updates through the bot's dispatcher with a local Bot API session"""
+    from aiogram.types import Update
+
+    bot_module, session = bench_bot_module()
+    dispatcher, bot = bot_module.dp, bot_module.bot
+    calls_before = session.calls
+    conversations = [[(kind, Update.model_validate(raw, context={'bot': bot})) for kind, raw in conversation]
+                     for conversation in bot_conversations(workload, args.bot_updates)]
+
+    async def run() -> Dict:
+        latencies: Dict[str, List[float]] = {}
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def converse(conversation):
+            async with slots:
+                for kind, update in conversation:
+                    started = time.perf_counter()
+                    await dispatcher.feed_update(bot, update)
+                    latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(conversation) for conversation in conversations))
+        elapsed = time.perf_counter() - started
+
+        report = {kind: summarize(values) for kind, values in sorted(latencies.items())}
+        report['all'] = summarize([value for values in latencies.values() for value in values], elapsed)
+        report['api_calls'] = session.calls - calls_before
+        return report
+
+    return asyncio.run(run())
+
+
+def bench_webhook(args, workload: Workload) -> Dict:
+    """POST synthetic updates to the webhook app over HTTP
+
+    Requests with a missing or wrong secret must be turned away with 401.
+    The rest are acknowledged while at most --webhook-slots are processed
+    at once; the report gives acknowledgement latency, the time until every
+    update was processed and the most updates seen in flight together.
+    """
+    from aiohttp import ClientSession, web
+    from webhook import create_webhook_app
+
+    bot_module, session = bench_bot_module()
+    updates = [raw for conversation in bot_conversations(workload, args.bot_updates) for _, raw in conversation]
+
+    async def run() -> Dict:
+        app = create_webhook_app(bot_module.dp, bot_module.bot, BENCH_WEBHOOK_SECRET, path='/webhook',
+                                 max_concurrent=args.webhook_slots)
+        handler = app['webhook_handler']
+        max_in_flight = 0
+        process = handler._process
+
+        async def counted_process(update: Dict):
+            nonlocal max_in_flight
+            max_in_flight = max(max_in_flight, handler.in_flight)
+            await process(update)
+
+        handler._process = counted_process
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        port = free_port()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        url = f"http://127.0.0.1:{port}/webhook"
+
+        try:
+            async with ClientSession() as client:
+                rejected = {}
+                for label, headers in (('missing_secret', {}),
+                                       ('wrong_secret', {'X-Telegram-Bot-Api-Secret-Token': 'wrong'})):
+                    async with client.post(url, json=updates[0], headers=headers) as response:
+                        rejected[label] = response.status
+                rejected_processed = handler.in_flight
+
+                latencies: List[float] = []
+                errors = 0
+                pending = iter(updates)
+                headers = {'X-Telegram-Bot-Api-Secret-Token': BENCH_WEBHOOK_SECRET}
+
+                async def poster():
+                    nonlocal errors
+                    for update in pending:
+                        request_started = time.perf_counter()
+                        async with client.post(url, json=update, headers=headers) as response:
+                            await response.read()
+                            errors += response.status != 200
+                        latencies.append(time.perf_counter() - request_started)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(poster() for _ in range(args.concurrency)))
+                acknowledged = time.perf_counter() - started
+                while handler.in_flight:
+                    await asyncio.sleep(0.005)
+                processed = time.perf_counter() - started
+        finally:
+            await runner.cleanup()
+
+        report = summarize(latencies, acknowledged, errors)
+        report.update({
+            'rejected_status': rejected,
+            'rejected_processed': rejected_processed,
+            'processed_seconds': round(processed, 3),
+            'slots': args.webhook_slots,
+            'max_in_flight': max_in_flight,
+            'within_slots': max_in_flight <= args.webhook_slots
+        })
+        return report
+
+    return asyncio.run(run())
+
+
+# Entry point
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the web app and bot against synthetic data")
+    parser.add_argument('--backend', choices=sorted(STORAGE_BACKENDS), default=os.getenv("STORAGE_BACKEND", "json"),
+                        help="storage backend to seed and benchmark (STORAGE_BACKEND)")
+    parser.add_argument('--tests', type=int, default=20, help="synthetic tests to seed")
+    parser.add_argument('--users', type=int, default=5000, help="synthetic users to seed")
+    parser.add_argument('--results', type=int, default=100000, help="synthetic results to seed, up to 1M")
+    parser.add_argument('--requests', type=int, default=500, help="requests per scenario")
+    parser.add_argument('--export-requests', type=int, default=10, help="requests for the export scenario")
+    parser.add_argument('--bot-updates', type=int, default=3000, help="updates fed to the bot dispatcher")
+    parser.add_argument('--webhook-slots', type=int, default=4,
+                        help="updates the webhook processes at once; below --concurrency so requests wait for slots")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent clients for the server and bot")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="web scenarios to run")
+    parser.add_argument('--targets', nargs='+', choices=('client', 'server', 'bot', 'webhook'),
+                        default=['client', 'server', 'bot', 'webhook'], help="what to drive")
+    parser.add_argument('--server-mode', choices=('dev', 'production'), default='production',
+                        help="serving mode of the live server")
+    parser.add_argument('--workers', type=int, default=4, help="production worker processes")
+    parser.add_argument('--workdir', help="directory holding data/; a temporary one is used if omitted")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the data already in --workdir")
+    parser.add_argument('--keep', action='store_true', help="keep the temporary workdir")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for reproducible data and requests")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--verbose', action='store_true', help="show application logs")
+    args = parser.parse_args(argv)
+    if args.skip_seed and not args.workdir:
+        parser.error("--skip-seed needs --workdir")
+    return args
+
+
+def main(argv=None) -> Dict:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='webbot-bench-'))
+    data_dir = os.path.join(workdir, 'data')
+    rng = random.Random(args.seed)
+
+    # The app reads data/ relative to the working directory
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ['STORAGE_BACKEND'] = args.backend
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.getenv('PYTHONPATH')])))
+
+    report: Dict = {
+        'backend': args.backend,
+        'python': sys.version.split()[0],
+        'started_at': datetime.now().isoformat(),
+        'peak_rss_mb': {}
+    }
+    try:
+        if not args.skip_seed:
+            report['seed'] = seed(data_dir, args.backend, args.tests, args.users, args.results, rng)
+            report['peak_rss_mb']['seed'] = peak_rss_mb()
+
+        workload = Workload(data_dir, args.backend, rng)
+        if 'client' in args.targets:
+            report['test_client'] = bench_test_client(args, workload)
+            report['peak_rss_mb']['test_client'] = peak_rss_mb()
+        if 'bot' in args.targets:
+            report['bot'] = bench_bot(args, workload)
+            report['peak_rss_mb']['bot'] = peak_rss_mb()
+        if 'webhook' in args.targets:
+            report['webhook'] = bench_webhook(args, workload)
+            report['peak_rss_mb']['webhook'] = peak_rss_mb()
+        if 'server' in args.targets:
+            report['server'] = bench_server(args, workload, workdir, env)
+            report['peak_rss_mb']['server'] = report['server'].pop('peak_rss_mb', None)
+    finally:
+        if _bench_bot is not None:
+            _bench_bot[0].async_data.shutdown()
+        os.chdir(REPO_DIR)
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
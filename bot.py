@@ -7,34 +7,104 @@ import asyncio
 import logging
 import os
 import json
+import time
+from collections import OrderedDict
+from typing import Optional
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
+from async_data import AsyncDataManager, LoopLagMonitor
 from data_manager import DataManager
+from fsm_storage import SQLiteFSMStorage
+from metrics import BotMetricsMiddleware, start_metrics_server
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Bot token from environment
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
-
-# Initialize bot and dispatcher (only if token is provided)
+# How updates arrive: "polling" or "webhook" (see webhook.py for its settings)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Bot API server base URL, for a local Bot API server or a fake one in load tests
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Conversation state store: "sqlite" survives restarts and is shared by bot processes
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+# Local port serving the bot process's /metrics; 0 disables it
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "0"))
+
+# Set up by init_bot(), so importing this module opens no data files or sessions
 bot = None
 dp = None
 storage = None
-data_manager = DataManager()
+data_manager = None
+# Handlers go through this so blocking storage work stays off the event loop
+async_data = None
 
-if BOT_TOKEN and BOT_TOKEN != "your_bot_token_here":
-    try:
-        bot = Bot(token=BOT_TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
-        logger.info("Bot initialized successfully")
-    except Exception as e:
-        logger.warning(f"Failed to initialize bot: {e}")
+
+def init_bot(manager: Optional[DataManager] = None):
+    """Create the data access, bot and dispatcher on first use (bot and dp only if a token is provided)
+
+    Pass the process's DataManager when it already has one, such as when
+    the web app runs alongside the bot.
+    """
+    global bot, dp, storage, data_manager, async_data
+    if async_data is not None:
+        return
+    data_manager = manager or DataManager()
+    async_data = AsyncDataManager(data_manager)
+
+    if BOT_TOKEN and BOT_TOKEN != "your_bot_token_here":
+        try:
+            session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+            bot = Bot(token=BOT_TOKEN, session=session)
+            storage = MemoryStorage() if FSM_STORAGE == "memory" else SQLiteFSMStorage(os.path.join(data_manager.data_dir, "fsm.db"))
+            dp = Dispatcher(storage=storage)
+            logger.info("Bot initialized successfully")
+        except Exception as e:
+            logger.warning(f"Failed to initialize bot: {e}")
+
+
+# Rendered /status messages keyed by user id: (result count, rendered at, text)
+STATUS_CACHE_SIZE = 10000
+# Seconds a rendered message may be reused; bounds staleness after re-grading or title edits
+STATUS_CACHE_TTL = 60
+status_cache: "OrderedDict[int, tuple]" = OrderedDict()
+
+
+async def render_status(user_id: int) -> str:
+    """The /status message for a user, re-rendered only when they have new results"""
+    result_count = await async_data.count_user_results(user_id)
+    cached = status_cache.get(user_id)
+    if cached and cached[0] == result_count and time.monotonic() - cached[1] < STATUS_CACHE_TTL:
+        status_cache.move_to_end(user_id)
+        return cached[2]
+
+    results = await async_data.get_user_results(user_id, limit=5)
+    if not results:
+        status_text = "📊 No test results found."
+    else:
+        tests = await async_data.get_tests_by_codes([result['test_code'] for result in results])
+
+        status_text = "📊 **Your Recent Test Results:**\n\n"
+        for result in results:
+            test = tests.get(result['test_code'])
+            test_title = test['title'] if test else f"Test {result['test_code']}"
+
+            status_text += f"📝 **{test_title}**\n"
+            status_text += f"• Score: {result['score']:.1f}%\n"
+            status_text += f"• Date: {result['submitted_at'][:10]}\n"
+            status_text += f"• Code: {result['test_code']}\n\n"
+
+    status_cache[user_id] = (result_count, time.monotonic(), status_text)
+    status_cache.move_to_end(user_id)
+    if len(status_cache) > STATUS_CACHE_SIZE:
+        status_cache.popitem(last=False)
+    return status_text
 
 
 class TestStates(StatesGroup):
@@ -47,6 +117,10 @@ def register_handlers():
         logger.warning("Bot not initialized, skipping handler registration")
         return
 
+    # Handler latency histograms
+    dp.message.middleware(BotMetricsMiddleware('message'))
+    dp.callback_query.middleware(BotMetricsMiddleware('callback_query'))
+
     @dp.message(Command("start"))
     async def start_command(message: types.Message, state: FSMContext):
         """Handle /start command"""
@@ -54,7 +128,7 @@ def register_handlers():
         username = message.from_user.username or message.from_user.first_name
 
         # Register or update user
-        user_data = data_manager.get_or_create_user(user_id, username)
+        user_data = await async_data.get_or_create_user(user_id, username)
 
         welcome_text = f"🎓 Welcome to the Test System, {user_data['name']}!\n\n"
         welcome_text += "📝 To take a test, please enter your test code.\n"
@@ -97,7 +171,7 @@ def register_handlers():
             return
 
         # Check if test exists and is active
-        test = data_manager.get_test_by_code(code)
+        test = await async_data.get_test_by_code(code)
         if not test:
             await message.answer(
                 "❌ Test code not found. Please check your code and try again:"
@@ -164,22 +238,7 @@ def register_handlers():
     async def status_command(message: types.Message):
         """Handle /status command - show recent test results"""
         user_id = message.from_user.id
-        results = data_manager.get_user_results(user_id, limit=5)
-
-        if not results:
-            await message.answer("📊 No test results found.")
-            return
-
-        status_text = "📊 **Your Recent Test Results:**\n\n"
-        for result in results:
-            test = data_manager.get_test_by_code(result['test_code'])
-            test_title = test['title'] if test else f"Test {result['test_code']}"
-
-            status_text += f"📝 **{test_title}**\n"
-            status_text += f"• Score: {result['score']:.1f}%\n"
-            status_text += f"• Date: {result['submitted_at'][:10]}\n"
-            status_text += f"• Code: {result['test_code']}\n\n"
-
+        status_text = await render_status(user_id)
         await message.answer(status_text, parse_mode="Markdown")
 
     @dp.message()
@@ -191,22 +250,38 @@ def register_handlers():
         )
 
 
-async def start_bot():
-    """Start the bot"""
+async def start_bot(manager: Optional[DataManager] = None):
+    """Start the bot, on the given DataManager or a new one"""
+    init_bot(manager)
     if not bot or not dp:
         logger.warning("Bot not initialized, cannot start")
         return
 
     logger.info("Starting Telegram bot...")
+    lag_monitor = LoopLagMonitor()
+    metrics_runner = None
     try:
         # Register handlers
         register_handlers()
 
-        # Start polling
-        await dp.start_polling(bot)
+        lag_monitor.start()
+        if BOT_METRICS_PORT:
+            metrics_runner = await start_metrics_server(BOT_METRICS_PORT)
+            logger.info(f"Bot metrics served on 127.0.0.1:{BOT_METRICS_PORT}/metrics")
+        if BOT_MODE == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            # Start polling
+            await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Bot error: {e}")
         raise
+    finally:
+        await lag_monitor.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        async_data.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+"""
+Code Allocator Module
+Hands out unique 6-digit test codes from a keyed permutation of the code space
+"""
+
+import hashlib
+import json
+import logging
+import secrets
+import threading
+from typing import Callable, List, Optional
+
+from storage import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Codes are 000000-999999, split into two base-1000 halves for the Feistel network
+HALF_SPACE = 1000
+CODE_SPACE = HALF_SPACE * HALF_SPACE
+FEISTEL_ROUNDS = 4
+
+# Codes reserved from the shared cursor per file write
+RESERVATION_SIZE = 16
+
+
+class CodeSpaceExhausted(Exception):
+    """Raised when every 6-digit code has been handed out"""
+
+
+def permute(index: int, key: bytes) -> int:
+    """Map a position in [0, CODE_SPACE) to a unique code in the same range
+
+    A balanced Feistel network over the two base-1000 halves is a bijection
+    for any round function, so distinct positions never share a code and
+    consecutive positions look unrelated without the key.
+    """
+    left, right = divmod(index, HALF_SPACE)
+    for round_number in range(FEISTEL_ROUNDS):
+        digest = hashlib.blake2b(f"{round_number}:{right}".encode(), key=key, digest_size=4).digest()
+        left, right = right, (left + int.from_bytes(digest, 'big')) % HALF_SPACE
+    return left * HALF_SPACE + right
+
+
+class CodeAllocator:
+    """Allocates test codes by walking a cursor through a keyed permutation
+
+    The cursor and key live in a small state file. Each process reserves a
+    block of positions under the file lock and hands them out from memory,
+    so allocation needs no scan of existing tests and concurrent creators
+    (threads or processes) can never receive the same code. Reserved codes
+    a process doesn't use before exiting are skipped, not reissued.
+    """
+
+    def __init__(self, state_file: str, is_taken: Optional[Callable[[str], bool]] = None,
+                 reservation_size: int = RESERVATION_SIZE):
+        self.state_file = state_file
+        # Codes created before the allocator existed were picked at random
+        self.is_taken = is_taken or (lambda code: False)
+        self.reservation_size = reservation_size
+
+        self._lock = threading.Lock()
+        self._key: Optional[bytes] = None
+        self._reserved: List[int] = []
+
+    def _load_state(self) -> dict:
+        """Stored key and cursor; a missing or unreadable file starts a new permutation
+
+        Codes already taken by existing tests are still skipped via is_taken.
+        """
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt code allocator state {self.state_file}, reseeding: {e}")
+        return {'key': secrets.token_hex(16), 'cursor': 0}
+
+    def _reserve(self):
+        """Claim the next block of positions from the shared cursor"""
+        with FileLock.for_path(self.state_file):
+            state = self._load_state()
+            start = state['cursor']
+            if start >= CODE_SPACE:
+                raise CodeSpaceExhausted("All 6-digit test codes have been allocated")
+            end = min(start + self.reservation_size, CODE_SPACE)
+
+            state['cursor'] = end
+            atomic_write(self.state_file, lambda f: json.dump(state, f))
+
+        self._key = bytes.fromhex(state['key'])
+        self._reserved = list(range(end - 1, start - 1, -1))
+
+    def allocate(self) -> str:
+        """Return a 6-digit code no other caller has received"""
+        with self._lock:
+            while True:
+                if not self._reserved:
+                    self._reserve()
+                code = f"{permute(self._reserved.pop(), self._key):06d}"
+                if not self.is_taken(code):
+                    return code
+
+    @property
+    def allocated(self) -> int:
+        """Positions claimed from the shared cursor so far, by any process"""
+        return self._load_state()['cursor']
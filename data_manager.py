@@ -3,180 +3,277 @@ Data Management Module
 Handles all data operations for tests, users, and results
 """
 
+import atexit
+import base64
 import json
 import os
-import random
-import string
+import secrets
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional
+
+from analytics import compute_test_analytics
+from answer_codec import QUESTION_LAYOUT, answers_dict
+from code_allocator import CodeAllocator
+from metrics import DATA_MANAGER_SECONDS, timed
+from scoring import CompiledScorer
+from stats import StatsAggregator
+from storage import create_storage
+from user_registry import UserRegistry
+
+# Test fields students may see; everything else (answer_key, created_by) stays server-side
+PUBLIC_TEST_FIELDS = ('code', 'title', 'description', 'total_questions', 'time_limit', 'active')
+
+
+def encode_cursor(result: Dict) -> str:
+    """Opaque keyset cursor pointing just past a result"""
+    key = json.dumps([result['submitted_at'], result['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(submitted_at, id) from a keyset cursor, raising ValueError if malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(key)
+
+
+def public_test_view(test: Dict) -> Dict:
+    """Student-facing view of a test: details and question layout, no answers"""
+    view = {field: test.get(field) for field in PUBLIC_TEST_FIELDS}
+    view['questions'] = [
+        {'number': number, 'type': kind, ('options' if kind == 'choice' else 'parts'): choices}
+        for first, last, kind, choices in QUESTION_LAYOUT
+        for number in range(first, last + 1)
+    ]
+    return view
 
 
 class DataManager:
-    def __init__(self):
-        self.data_dir = "data"
+    def __init__(self, data_dir: str = "data", backend: Optional[str] = None):
+        self.data_dir = data_dir
         self.ensure_data_directory()
 
-        # Data file paths
-        self.tests_file = os.path.join(self.data_dir, "tests.json")
-        self.users_file = os.path.join(self.data_dir, "users.json")
-        self.results_file = os.path.join(self.data_dir, "results.json")
-        self.admins_file = os.path.join(self.data_dir, "admins.json")
+        # Storage backend, selected with the STORAGE_BACKEND environment variable
+        self.backend = backend or os.getenv("STORAGE_BACKEND", "json")
+        self.storage = create_storage(self.backend, self.data_dir)
+
+        # Compiled scorers keyed by test code
+        self._scorers: Dict[str, CompiledScorer] = {}
+
+        # Per-test analytics keyed by test code, stored with the
+        # (submission count, stats generation, scorer) they were computed from
+        self._analytics: Dict[str, tuple] = {}
+
+        # Public test views keyed by test code, stored with the public
+        # field values they were built from and their serialized JSON
+        self._public_tests: Dict[str, tuple] = {}
+
+        # Dashboard aggregates, kept up to date by the write methods below
+        self.stats = StatsAggregator(self.storage, os.path.join(self.data_dir, "stats.json"), self.backend,
+                                     scorer_for=self._scorer_for_code)
+
+        # Users, with visits and test counts written in periodic batches
+        self.users = UserRegistry(self.storage)
+        atexit.register(self.users.stop)
+
+        # Collision-free test codes; legacy random codes are skipped when met
+        self.code_allocator = CodeAllocator(os.path.join(self.data_dir, "code_allocator.json"),
+                                            is_taken=lambda code: self.storage.get_test(code) is not None)
 
-        # Initialize data files
-        self.initialize_data_files()
+    @property
+    def version(self) -> int:
+        """Counter bumped by the storage backend on every write"""
+        return self.storage.version
 
     def ensure_data_directory(self):
         """Ensure data directory exists"""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
-    def initialize_data_files(self):
-        """Initialize JSON data files if they don't exist"""
-        default_data = {
-            self.tests_file: {},
-            self.users_file: {},
-            self.results_file: [],
-            self.admins_file: {
-                "admin": {
-                    "id": "admin",
-                    "username": "admin",
-                    "password_hash": "pbkdf2:sha256:260000$4xI8Q9v0RQKbF0Ky$8f1e2d3c4b5a6e7f8g9h0i1j2k3l4m5n6o7p8q9r0s1t2u3v4w5x6y7z8a9b0c1d2e3f4g5h6i7j8k9l0m1n2o3p4q5r6s7t8u9v0w1x2y3z4a5b6c7d8e9f0g1h2i3j4k5l6m7n8o9p0q1r2s3t4u5v6w7x8y9z0a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6q7r8s9t0u1v2w3x4y5z6",
-                    "created_at": datetime.now().isoformat(),
-                    "role": "super_admin"
-                }
-            }
-        }
-
-        for file_path, default_content in default_data.items():
-            if not os.path.exists(file_path):
-                self.save_json(file_path, default_content)
-
-    def load_json(self, file_path: str) -> Any:
-        """Load JSON data from file"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {} if file_path != self.results_file else []
-
-    def save_json(self, file_path: str, data: Any) -> bool:
-        """Save JSON data to file"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            print(f"Error saving JSON to {file_path}: {e}")
-            return False
-
     # User Management
+    @timed(DATA_MANAGER_SECONDS, method='get_or_create_user')
     def get_or_create_user(self, user_id: int, username: str) -> Dict:
         """Get existing user or create new one"""
-        users = self.load_json(self.users_file)
-        user_id_str = str(user_id)
-
-        if user_id_str not in users:
-            users[user_id_str] = {
-                'id': user_id,
-                'name': username,
-                'username': username,
-                'created_at': datetime.now().isoformat(),
-                'last_seen': datetime.now().isoformat(),
-                'tests_taken': 0
-            }
-        else:
-            # Update last seen
-            users[user_id_str]['last_seen'] = datetime.now().isoformat()
-
-        self.save_json(self.users_file, users)
-        return users[user_id_str]
+        return self.users.get_or_create(user_id, username)
 
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user by ID"""
-        users = self.load_json(self.users_file)
-        return users.get(str(user_id))
+        return self.users.get(user_id)
 
     # Test Management
     def generate_test_code(self) -> str:
         """Generate unique 6-digit test code"""
-        tests = self.load_json(self.tests_file)
-
-        while True:
-            code = ''.join(random.choices(string.digits, k=6))
-            if code not in tests:
-                return code
+        return self.code_allocator.allocate()
 
     def create_test(self, test_data: Dict) -> bool:
         """Create a new test"""
-        tests = self.load_json(self.tests_file)
-        tests[test_data['code']] = test_data
-        return self.save_json(self.tests_file, tests)
+        if not self.storage.save_test(test_data):
+            return False
+        self.stats.test_saved(test_data)
+        return True
 
     def get_test_by_code(self, code: str) -> Optional[Dict]:
         """Get test by code"""
-        tests = self.load_json(self.tests_file)
-        return tests.get(code)
+        return self.storage.get_test(code)
+
+    def get_tests_by_codes(self, codes: List[str]) -> Dict[str, Dict]:
+        """Get several tests by code in one lookup"""
+        return self.storage.get_tests_by_codes(codes)
 
     def get_all_tests(self) -> List[Dict]:
         """Get all tests"""
-        tests = self.load_json(self.tests_file)
-        return list(tests.values())
+        return self.storage.get_all_tests()
+
+    @timed(DATA_MANAGER_SECONDS, method='get_test_detail')
+    def get_test_detail(self, code: str) -> Optional[Dict]:
+        """Full test with per-question correct and incorrect counts over its results"""
+        test = self.storage.get_test(code)
+        if not test:
+            return None
+
+        # Counts are kept up to date by the stats aggregator as results arrive
+        scorer = self.get_scorer(test)
+        submissions, correct_counts = self.stats.question_counts(code, scorer)
+        detail = dict(test)
+        detail['submissions'] = submissions
+        detail['questions'] = [{
+            'question': question_num,
+            'type': 'text' if is_text else 'multiple_choice',
+            'correct_answer': correct_answer,
+            'correct': correct,
+            'incorrect': submissions - correct
+        } for question_num, is_text, correct_answer, correct in zip(
+            scorer.questions, scorer.text_slots, scorer.answer_key.values(), correct_counts)]
+        return detail
+
+    def _public_test_entry(self, code: str) -> Optional[tuple]:
+        """Cached (fields, view, payload) for an active test, rebuilt only after an edit"""
+        test = self.storage.get_test(code)
+        if not test or not test.get('active'):
+            self._public_tests.pop(code, None)
+            return None
+
+        # Compared by value, so edits made by other processes are seen too
+        fields = tuple(test.get(field) for field in PUBLIC_TEST_FIELDS)
+        cached = self._public_tests.get(code)
+        if cached and cached[0] == fields:
+            return cached
+
+        view = public_test_view(test)
+        payload = json.dumps(view, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        entry = (fields, view, payload)
+        self._public_tests[code] = entry
+        return entry
+
+    def get_public_test(self, code: str) -> Optional[Dict]:
+        """Student-facing view of an active test, without its answer key"""
+        entry = self._public_test_entry(code)
+        return entry[1] if entry else None
+
+    def get_public_test_payload(self, code: str) -> Optional[bytes]:
+        """Serialized public view of an active test; the same bytes object until the test changes"""
+        entry = self._public_test_entry(code)
+        return entry[2] if entry else None
 
     def toggle_test_status(self, code: str) -> bool:
         """Toggle test active status"""
-        tests = self.load_json(self.tests_file)
-        if code in tests:
-            tests[code]['active'] = not tests[code].get('active', False)
-            return self.save_json(self.tests_file, tests)
+        test = self.storage.get_test(code)
+        if test:
+            test['active'] = not test.get('active', False)
+            if self.storage.save_test(test):
+                self.stats.test_saved(test)
+                return True
         return False
 
     def delete_test(self, code: str) -> bool:
         """Delete test"""
-        tests = self.load_json(self.tests_file)
-        if code in tests:
-            del tests[code]
-            return self.save_json(self.tests_file, tests)
-        return False
+        self._scorers.pop(code, None)
+        self._public_tests.pop(code, None)
+        if not self.storage.delete_test(code):
+            return False
+        self.stats.test_deleted(code)
+        return True
 
     # Answer Scoring
+    def get_scorer(self, test: Dict) -> CompiledScorer:
+        """Get the compiled scorer for a test, rebuilding it if the answer key changed"""
+        answer_key = test.get('answer_key') or {}
+        scorer = self._scorers.get(test['code'])
+        if scorer is None or scorer.answer_key != answer_key:
+            scorer = CompiledScorer(answer_key)
+            self._scorers[test['code']] = scorer
+        return scorer
+
+    def _scorer_for_code(self, code: str) -> Optional[CompiledScorer]:
+        """Compiled scorer for a stored test, or None if it doesn't exist"""
+        test = self.storage.get_test(code)
+        return self.get_scorer(test) if test else None
+
+    @timed(DATA_MANAGER_SECONDS, method='calculate_score')
     def calculate_score(self, test: Dict, answers: Dict) -> float:
         """Calculate test score based on answers"""
         if not test.get('answer_key') or not answers:
             return 0.0
-
-        answer_key = test['answer_key']
-        total_questions = len(answer_key)
-        correct_answers = 0
-
-        for question_num, correct_answer in answer_key.items():
-            user_answer = answers.get(question_num, '').strip().upper()
-
-            # Handle different question types
-            if isinstance(correct_answer, dict):
-                # Text questions with parts A and B
-                if 'A' in correct_answer and 'B' in correct_answer:
-                    user_a = answers.get(f"{question_num}A", '').strip().upper()
-                    user_b = answers.get(f"{question_num}B", '').strip().upper()
-                    correct_a = str(correct_answer['A']).upper()
-                    correct_b = str(correct_answer['B']).upper()
-
-                    if user_a == correct_a and user_b == correct_b:
-                        correct_answers += 1
-            else:
-                # Multiple choice questions
-                correct_answer_str = str(correct_answer).upper()
-                if user_answer == correct_answer_str:
-                    correct_answers += 1
-
-        return (correct_answers / total_questions) * 100 if total_questions > 0 else 0.0
+        return self.get_scorer(test).score(answers)
+
+    @timed(DATA_MANAGER_SECONDS, method='rescore_test')
+    def rescore_test(self, code: str) -> int:
+        """Re-grade every stored result for a test, returning how many scores changed"""
+        test = self.storage.get_test(code)
+        if not test:
+            return 0
+
+        scorer = self.get_scorer(test)
+        changed = []
+
+        def regrade(results: List[Dict]) -> List[Dict]:
+            # Runs under the storage's results write lock, so no result can be
+            # stored between counting them all and rewriting their scores
+            self.stats.catch_up()
+            answers = [r['answers'] for r in results]
+            matrix = scorer.correct_matrix(answers)
+            self.stats.count_correct(code, scorer, results, matrix)
+            scores = scorer.score_many(answers, matrix)
+            changed.extend((result, score) for result, score in zip(results, scores) if score != result['score'])
+            return [dict(result, score=score) for result, score in changed]
+
+        with self.stats.lock:
+            if not self.storage.rewrite_test_results(code, regrade):
+                return 0
+            if changed:
+                self.stats.scores_changed(code, [(result['score'], score) for result, score in changed])
+                self._analytics.pop(code, None)
+        return len(changed)
+
+    @timed(DATA_MANAGER_SECONDS, method='get_test_analytics')
+    def get_test_analytics(self, code: str) -> Optional[Dict]:
+        """Get item analysis for a test, recomputed only after new submissions"""
+        test = self.storage.get_test(code)
+        if not test:
+            return None
+
+        self.stats.catch_up()
+        scorer = self.get_scorer(test)
+        # The stats generation moves when any process re-grades scores
+        key = (self.stats.test_submissions.get(code, 0), self.stats.generation, scorer)
+        cached = self._analytics.get(code)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        analytics = compute_test_analytics(test, self.storage.get_results_by_test(code), scorer)
+        self._analytics[code] = (key, analytics)
+        return analytics
 
     # Results Management
-    def save_test_result(self, user_id: int, test_code: str, answers: Dict, score: float) -> str:
-        """Save test result"""
-        results = self.load_json(self.results_file)
-
-        result = {
-            'id': f"{user_id}_{test_code}_{int(datetime.now().timestamp())}",
+    def build_result(self, user_id: int, test_code: str, answers: Dict, score: float) -> Dict:
+        """Build a result record ready to be stored"""
+        return {
+            # Random suffix keeps ids unique when a user resubmits within a second
+            'id': f"{user_id}_{test_code}_{int(datetime.now().timestamp())}_{secrets.token_hex(3)}",
             'user_id': user_id,
             'test_code': test_code,
             'answers': answers,
@@ -184,116 +281,129 @@ class DataManager:
             'submitted_at': datetime.now().isoformat()
         }
 
-        results.append(result)
-        self.save_json(self.results_file, results)
+    @timed(DATA_MANAGER_SECONDS, method='save_results')
+    def save_results(self, results: List[Dict]) -> bool:
+        """Store a batch of result records and update user test counts"""
+        if not self.storage.add_results(results):
+            return False
+        self.stats.result_saved()
 
-        # Update user test count
-        users = self.load_json(self.users_file)
-        user_id_str = str(user_id)
-        if user_id_str in users:
-            users[user_id_str]['tests_taken'] += 1
-            self.save_json(self.users_file, users)
+        # Update user test counts; the registry stores them with its next batch
+        counts: Dict[int, int] = {}
+        for result in results:
+            counts[result['user_id']] = counts.get(result['user_id'], 0) + 1
+        self.users.record_tests(counts)
+        return True
 
+    def save_test_result(self, user_id: int, test_code: str, answers: Dict, score: float) -> str:
+        """Save test result"""
+        result = self.build_result(user_id, test_code, answers, score)
+        self.save_results([result])
         return result['id']
 
+    def get_result(self, result_id: str) -> Optional[Dict]:
+        """Get a result by id"""
+        return self.storage.get_result(result_id)
+
+    @timed(DATA_MANAGER_SECONDS, method='get_result_detail')
+    def get_result_detail(self, result_id: str) -> Optional[Dict]:
+        """One result with decoded answers, user and test details and a per-question breakdown"""
+        result = self.storage.get_result(result_id)
+        if result is None:
+            return None
+
+        test = self.storage.get_test(result['test_code'])
+        user = self.get_user(result['user_id']) or {}
+        detail = dict(result, answers=answers_dict(result['answers']))
+        detail['user_name'] = user.get('name', 'Unknown')
+        detail['test_title'] = (test or {}).get('title', 'Unknown Test')
+        # A deleted test leaves nothing to mark the answers against
+        detail['questions'] = self.get_scorer(test).breakdown(result['answers']) if test else []
+        detail['correct_count'] = sum(question['correct'] for question in detail['questions'])
+        return detail
+
+    @timed(DATA_MANAGER_SECONDS, method='get_user_results')
     def get_user_results(self, user_id: int, limit: int = None) -> List[Dict]:
         """Get results for a specific user"""
-        results = self.load_json(self.results_file)
-        user_results = [r for r in results if r['user_id'] == user_id]
-        user_results.sort(key=lambda x: x['submitted_at'], reverse=True)
-
-        if limit:
-            user_results = user_results[:limit]
+        return self.storage.get_user_results(user_id, limit)
 
-        return user_results
+    def count_user_results(self, user_id: int) -> int:
+        """Number of results a user has submitted"""
+        return self.storage.count_user_results(user_id)
 
     def get_results_by_test(self, test_code: str) -> List[Dict]:
         """Get all results for a specific test"""
-        results = self.load_json(self.results_file)
-        return [r for r in results if r['test_code'] == test_code]
+        return self.storage.get_results_by_test(test_code)
+
+    def iter_results_by_test(self, test_code: str, since: Optional[str] = None,
+                             limit: Optional[int] = None) -> Iterator[Dict]:
+        """Stream results for a test in submission order"""
+        return self.storage.iter_results_by_test(test_code, since, limit)
 
     def get_all_results(self) -> List[Dict]:
         """Get all results"""
-        results = self.load_json(self.results_file)
-        results.sort(key=lambda x: x['submitted_at'], reverse=True)
-        return results
+        return self.storage.get_all_results()
+
+    @timed(DATA_MANAGER_SECONDS, method='query_results')
+    def query_results(self, cursor: Optional[str] = None, limit: int = 50, **filters) -> Dict:
+        """One page of filtered results with user and test details, plus the cursor for the next page"""
+        after = decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to learn whether another page exists
+        rows = self.storage.query_results(after=after, limit=limit + 1, **filters)
+        has_more = len(rows) > limit
+        # Answers are left out; they're decoded only for a single result's detail view
+        page = [{key: value for key, value in r.items() if key != 'answers'} for r in rows[:limit]]
+
+        tests = self.storage.get_tests_by_codes([result['test_code'] for result in page])
+        users: Dict[int, Dict] = {}
+        for result in page:
+            if result['user_id'] not in users:
+                users[result['user_id']] = self.storage.get_user(result['user_id']) or {}
+            result['user_name'] = users[result['user_id']].get('name', 'Unknown')
+            result['test_title'] = (tests.get(result['test_code']) or {}).get('title', 'Unknown Test')
+
+        return {
+            'results': page,
+            'next_cursor': encode_cursor(page[-1]) if has_more else None
+        }
 
+    @timed(DATA_MANAGER_SECONDS, method='get_recent_results')
     def get_recent_results(self, limit: int = 10) -> List[Dict]:
         """Get recent results with user and test details"""
-        results = self.load_json(self.results_file)
-        users = self.load_json(self.users_file)
-        tests = self.load_json(self.tests_file)
-
-        recent = sorted(results, key=lambda x: x['submitted_at'], reverse=True)[:limit]
+        # Copy so the enrichment below doesn't leak into cached results
+        recent = [dict(r) for r in self.storage.get_recent_results(limit)]
 
         # Enrich with user and test data
         for result in recent:
-            user = users.get(str(result['user_id']), {})
-            test = tests.get(result['test_code'], {})
+            user = self.storage.get_user(result['user_id']) or {}
+            test = self.storage.get_test(result['test_code']) or {}
             result['user_name'] = user.get('name', 'Unknown')
             result['test_title'] = test.get('title', 'Unknown Test')
 
         return recent
 
     # Statistics
+    @timed(DATA_MANAGER_SECONDS, method='get_dashboard_stats')
     def get_dashboard_stats(self) -> Dict:
         """Get dashboard statistics"""
-        tests = self.load_json(self.tests_file)
-        users = self.load_json(self.users_file)
-        results = self.load_json(self.results_file)
-
-        active_tests = len([t for t in tests.values() if t.get('active', False)])
-        total_users = len(users)
-        total_submissions = len(results)
-
-        # Calculate average score
-        if results:
-            avg_score = sum(r['score'] for r in results) / len(results)
-        else:
-            avg_score = 0
-
-        return {
-            'total_tests': len(tests),
-            'active_tests': active_tests,
-            'total_users': total_users,
-            'total_submissions': total_submissions,
-            'average_score': round(avg_score, 1)
-        }
+        stats = self.stats.dashboard()
+        stats['total_users'] = self.storage.count_users()
+        return stats
 
+    @timed(DATA_MANAGER_SECONDS, method='get_detailed_stats')
     def get_detailed_stats(self) -> Dict:
         """Get detailed statistics for charts"""
-        results = self.load_json(self.results_file)
-        tests = self.load_json(self.tests_file)
+        return self.stats.detailed()
 
-        # Score distribution
-        score_ranges = {'0-20': 0, '21-40': 0, '41-60': 0, '61-80': 0, '81-100': 0}
-        for result in results:
-            score = result['score']
-            if score <= 20:
-                score_ranges['0-20'] += 1
-            elif score <= 40:
-                score_ranges['21-40'] += 1
-            elif score <= 60:
-                score_ranges['41-60'] += 1
-            elif score <= 80:
-                score_ranges['61-80'] += 1
-            else:
-                score_ranges['81-100'] += 1
-
-        # Test popularity
-        test_counts = {}
-        for result in results:
-            test_code = result['test_code']
-            test_title = tests.get(test_code, {}).get('title', f'Test {test_code}')
-            test_counts[test_title] = test_counts.get(test_title, 0) + 1
-
-        return {
-            'score_distribution': score_ranges,
-            'test_popularity': test_counts
-        }
+    def get_test_summary(self, code: str) -> Dict:
+        """Get submission count, average and score spread for a test"""
+        return self.stats.test_summary(code)
 
     # Admin Management
     def get_admin(self, username: str) -> Optional[Dict]:
         """Get admin by username"""
-        admins = self.load_json(self.admins_file)
-        return admins.get(username)
+        return self.storage.get_admin(username)
+
+    def get_all_admins(self) -> List[Dict]:
+        """Get all admin accounts"""
+        return self.storage.get_all_admins()
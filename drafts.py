@@ -0,0 +1,180 @@
+"""
+Drafts Module
+Autosaved in-progress test attempts, coalesced in memory and persisted in batches
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+from answer_codec import CHOICE_SLOTS, TEXT_PARTS, TEXT_SLOTS
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of pending draft changes
+DRAFT_FLUSH_INTERVAL = float(os.getenv("DRAFT_FLUSH_INTERVAL", "5"))
+# Hours a draft is kept after its last change
+DRAFT_TTL_HOURS = float(os.getenv("DRAFT_TTL_HOURS", "24"))
+# Longest answer, or text answer part, a draft accepts
+DRAFT_MAX_ANSWER_LENGTH = 500
+
+DraftKey = Tuple[int, str]
+
+
+def clean_patch(changes: Any) -> Dict[str, Any]:
+    """Validate a draft patch of question number -> answer, None clearing an answer
+
+    Raises ValueError for anything that isn't an answer sheet question or a
+    plausible answer, so a misbehaving client can't grow drafts unbounded.
+    """
+    if not isinstance(changes, dict):
+        raise ValueError('answers must be an object')
+
+    cleaned = {}
+    for question_num, value in changes.items():
+        if value is None:
+            pass
+        elif question_num in CHOICE_SLOTS:
+            if not isinstance(value, str) or len(value) > DRAFT_MAX_ANSWER_LENGTH:
+                raise ValueError(f'Invalid answer for question {question_num}')
+        elif question_num in TEXT_SLOTS:
+            if not (isinstance(value, dict) and set(value) <= set(TEXT_PARTS)
+                    and all(isinstance(part, str) and len(part) <= DRAFT_MAX_ANSWER_LENGTH
+                            for part in value.values())):
+                raise ValueError(f'Invalid answer for question {question_num}')
+        else:
+            raise ValueError(f'Unknown question: {question_num}')
+        cleaned[question_num] = value
+    return cleaned
+
+
+class DraftStore:
+    """In-progress attempts autosaved by the student web app
+
+    Each save is a patch of changed answers. Patches are merged in memory
+    per attempt, later values replacing earlier ones, and a background
+    thread stores everything pending in one write per interval, however
+    many saves arrived. Storage applies the changes on top of the stored
+    draft, so patches flushed by different worker processes combine rather
+    than overwrite each other. Reads overlay this process's pending changes
+    on the stored draft; changes held by other processes show up after
+    their next flush.
+    """
+
+    def __init__(self, storage, flush_interval: float = DRAFT_FLUSH_INTERVAL, ttl_hours: float = DRAFT_TTL_HOURS):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.ttl = timedelta(hours=ttl_hours)
+
+        self._lock = threading.Lock()
+        # Pending change per attempt: {'answers': patch, 'started_at': ..., 'updated_at': ...}
+        self._pending: Dict[DraftKey, Dict] = {}
+        # Attempts submitted since the last flush, whose stored drafts are stale
+        self._discarded: Set[DraftKey] = set()
+
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, user_id: int, test_code: str) -> Optional[Dict]:
+        """A saved attempt with any pending changes applied, or None"""
+        key = (user_id, test_code)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending = dict(pending, answers=dict(pending['answers']))
+            discarded = key in self._discarded
+
+        stored = None if discarded else self.storage.get_draft(user_id, test_code)
+        if stored is not None and stored['updated_at'] < (datetime.now() - self.ttl).isoformat():
+            stored = None
+        if pending is None:
+            return stored
+
+        draft = stored or {'user_id': user_id, 'test_code': test_code, 'answers': {},
+                           'started_at': pending['started_at']}
+        for question_num, value in pending['answers'].items():
+            if value is None:
+                draft['answers'].pop(question_num, None)
+            else:
+                draft['answers'][question_num] = value
+        draft['updated_at'] = pending['updated_at']
+        return draft
+
+    def patch(self, user_id: int, test_code: str, changes: Dict) -> str:
+        """Queue changed answers for an attempt, returning the save time"""
+        changes = clean_patch(changes)
+        now = datetime.now().isoformat()
+        with self._lock:
+            pending = self._pending.get((user_id, test_code))
+            if pending is None:
+                pending = self._pending[(user_id, test_code)] = {'answers': {}, 'started_at': now}
+            pending['answers'].update(changes)
+            pending['updated_at'] = now
+        self._ensure_flusher()
+        return now
+
+    def discard(self, user_id: int, test_code: str):
+        """Forget an attempt once it has been submitted"""
+        with self._lock:
+            self._pending.pop((user_id, test_code), None)
+            self._discarded.add((user_id, test_code))
+        self._ensure_flusher()
+
+    @property
+    def pending_count(self) -> int:
+        """Attempts with changes not yet stored"""
+        with self._lock:
+            return len(self._pending) + len(self._discarded)
+
+    def flush(self) -> bool:
+        """Store all pending changes in one write"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            discarded, self._discarded = self._discarded, set()
+        if not pending and not discarded:
+            return True
+
+        expire_before = (datetime.now() - self.ttl).isoformat()
+        try:
+            stored = self.storage.update_drafts(pending, list(discarded), expire_before)
+        except Exception as e:
+            logger.error(f"Error storing {len(pending)} drafts: {e}")
+            stored = False
+        if not stored:
+            # Put them back for the next attempt, under anything newer
+            with self._lock:
+                for key, change in pending.items():
+                    if key in self._discarded:
+                        continue
+                    newer = self._pending.get(key)
+                    if newer is not None:
+                        change['answers'].update(newer['answers'])
+                        change['updated_at'] = newer['updated_at']
+                    self._pending[key] = change
+                self._discarded |= discarded
+        return stored
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop the background flusher and store what's pending"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_flusher(self):
+        # Started on first use, so processes that never autosave don't spawn it
+        if self._thread is None and not self._stopping:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="draft-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            if not self._stopping:
+                self.flush()
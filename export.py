@@ -0,0 +1,87 @@
+"""
+Export Module
+Streams test results as CSV or NDJSON rows with per-question columns
+"""
+
+import csv
+import io
+import json
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from answer_codec import answers_dict
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows buffered per chunk handed to the WSGI server
+ROWS_PER_CHUNK = 200
+
+
+def answer_columns(test: Dict) -> List[tuple]:
+    """(column name, question, part) for every answer field of a test"""
+    columns = []
+    for question_num, correct_answer in (test.get('answer_key') or {}).items():
+        if isinstance(correct_answer, dict):
+            columns.append((f"Q{question_num}A", str(question_num), 'A'))
+            columns.append((f"Q{question_num}B", str(question_num), 'B'))
+        else:
+            columns.append((f"Q{question_num}", str(question_num), None))
+    return columns
+
+
+def flatten_answers(answers: Dict, columns: List[tuple]) -> Dict[str, str]:
+    """Submitted answers keyed by export column name"""
+    flat = {}
+    for name, question_num, part in columns:
+        value = answers.get(question_num)
+        if part is not None:
+            value = value.get(part) if isinstance(value, dict) else answers.get(f"{question_num}{part}")
+        flat[name] = '' if value is None or isinstance(value, dict) else str(value)
+    return flat
+
+
+def export_results(test: Dict, results: Iterable[Dict], get_user: Callable[[int], Optional[Dict]],
+                   fmt: str = 'csv') -> Iterator[str]:
+    """Yield chunks of an export without holding more than one chunk of rows"""
+    columns = answer_columns(test)
+    user_names: Dict[int, str] = {}
+
+    def user_name(user_id: int) -> str:
+        if user_id not in user_names:
+            user = get_user(user_id) or {}
+            user_names[user_id] = user.get('name', 'Unknown')
+        return user_names[user_id]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(['Result ID', 'Student Name', 'User ID', 'Test Code', 'Score', 'Submitted Date']
+                        + [name for name, _, _ in columns])
+
+    rows = 0
+    for result in results:
+        answers = flatten_answers(answers_dict(result.get('answers')), columns)
+        if fmt == 'csv':
+            writer.writerow([result['id'], user_name(result['user_id']), result['user_id'], result['test_code'],
+                             f"{result['score']:.1f}", result['submitted_at']] + list(answers.values()))
+        else:
+            buffer.write(json.dumps({
+                'id': result['id'],
+                'user_id': result['user_id'],
+                'user_name': user_name(result['user_id']),
+                'test_code': result['test_code'],
+                'score': result['score'],
+                'submitted_at': result['submitted_at'],
+                'answers': answers
+            }, ensure_ascii=False) + '\n')
+
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,157 @@
+"""
+FSM Storage Module
+SQLite-backed aiogram FSM storage with TTL expiry and an in-process LRU cache
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+# Seconds a conversation's state and data live after their last update
+FSM_TTL = int(os.getenv("FSM_TTL", str(24 * 60 * 60)))
+# Conversations kept in the in-process cache
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# Seconds between sweeps of expired rows
+PURGE_INTERVAL = 600
+
+_EMPTY = (None, {}, 0.0)
+
+
+class SQLiteFSMStorage(BaseStorage):
+    """FSM state and data in an SQLite table, shared by every bot process
+
+    Reads are served from an LRU cache. SQLite's data_version changes
+    whenever another connection commits, so the cache is dropped as soon
+    as a different process writes and this one never serves stale state.
+
+    The connection and cache belong to a single storage thread. Every get
+    and set runs there as one call, so SQLite never blocks the event loop
+    and a set's read-modify-write can't interleave with another.
+    """
+
+    def __init__(self, db_file: str, ttl: int = FSM_TTL, cache_size: int = FSM_CACHE_SIZE,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        # key -> (state, data, expires_at)
+        self._cache: "OrderedDict[str, Tuple[Optional[str], Dict, float]]" = OrderedDict()
+        self._last_purge = 0.0
+
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-storage")
+        self._executor.submit(self._open).result()
+
+    def _open(self):
+        # Opened on the storage thread, the only one that uses it
+        self._conn = sqlite3.connect(self.db_file, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_expires_at ON fsm(expires_at)")
+        self._data_version = self._current_data_version()
+
+    def _current_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self, key: str) -> Tuple[Optional[str], Dict, float]:
+        """Cached (state, data, expires_at) for a key, reading through to SQLite"""
+        data_version = self._current_data_version()
+        if data_version != self._data_version:
+            # Another process wrote since our last look
+            self._cache.clear()
+            self._data_version = data_version
+
+        entry = self._cache.get(key)
+        if entry is None:
+            row = self._conn.execute("SELECT state, data, expires_at FROM fsm WHERE key = ?", (key,)).fetchone()
+            entry = (row[0], json.loads(row[1]), row[2]) if row else _EMPTY
+            self._remember(key, entry)
+        else:
+            self._cache.move_to_end(key)
+
+        if entry[2] and entry[2] < time.time():
+            return _EMPTY
+        return entry
+
+    def _remember(self, key: str, entry: Tuple[Optional[str], Dict, float]):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _store(self, key: str, state: Optional[str], data: Dict):
+        """Write a key's state and data, refreshing its expiry"""
+        now = time.time()
+        if state is None and not data:
+            self._conn.execute("DELETE FROM fsm WHERE key = ?", (key,))
+            self._remember(key, _EMPTY)
+        else:
+            expires_at = now + self.ttl
+            self._conn.execute("""
+                INSERT INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, expires_at = excluded.expires_at
+            """, (key, state, json.dumps(data, ensure_ascii=False), expires_at))
+            self._remember(key, (state, data, expires_at))
+
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Delete expired conversations and return how many were removed; call on the storage thread"""
+        self._last_purge = time.time()
+        removed = self._conn.execute("DELETE FROM fsm WHERE expires_at < ?", (self._last_purge,)).rowcount
+        if removed:
+            self._cache.clear()
+        return removed
+
+    def _set_state(self, key: str, state: Optional[str]):
+        _, data, _ = self._load(key)
+        self._store(key, state, data)
+
+    def _set_data(self, key: str, data: Dict):
+        state, _, _ = self._load(key)
+        self._store(key, state, data)
+
+    async def _run(self, func, *args):
+        """Await a call on the storage thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._run(self._set_state, self.key_builder.build(key),
+                        state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._run(self._load, self.key_builder.build(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"Data must be a dict, got {type(data).__name__}")
+        await self._run(self._set_data, self.key_builder.build(key), data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._run(self._load, self.key_builder.build(key)))[1].copy()
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
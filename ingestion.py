@@ -0,0 +1,165 @@
+"""
+Submission Ingestion Module
+Bounded in-process queue with a background writer that stores results in batches
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from metrics import INGESTION_BATCH_SIZE, INGESTION_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many records are waiting...
+BATCH_SIZE = 500
+# ...or this many seconds after the first record of a batch arrived
+FLUSH_INTERVAL = 0.05
+# Records allowed to wait for the writer before submitters are pushed back
+MAX_PENDING = 10000
+# Seconds a submitter waits for queue space before giving up
+ENQUEUE_TIMEOUT = 2.0
+# Seconds between attempts when storage rejects a batch
+RETRY_DELAY = 0.5
+# Seconds after acceptance that a result missing from storage may still be
+# queued in another worker process
+PENDING_GRACE = 60
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Raised when the ingestion queue has no room for a submission"""
+
+
+def _accepted_at(result_id: str) -> Optional[int]:
+    """Acceptance time embedded in a DataManager.build_result id, or None"""
+    try:
+        return int(result_id.rsplit('_', 2)[-2])
+    except (IndexError, ValueError):
+        return None
+
+
+class SubmissionQueue:
+    """Accepts scored results and persists them from a background thread"""
+
+    def __init__(self, data_manager, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 max_pending: int = MAX_PENDING):
+        self.data_manager = data_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        # Records accepted but not yet stored, keyed by result id
+        self._pending: Dict[str, Dict] = {}
+        self._pending_lock = threading.Lock()
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, result: Dict, timeout: float = ENQUEUE_TIMEOUT) -> str:
+        """Queue a result record for storage and return its id"""
+        if self._stopping:
+            raise QueueFull("Submission queue is shutting down")
+
+        with self._pending_lock:
+            self._pending[result['id']] = result
+        try:
+            self._queue.put(result, timeout=timeout)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.pop(result['id'], None)
+            raise QueueFull("Too many submissions waiting to be stored") from None
+        return result['id']
+
+    def status(self, result_id: str) -> Dict:
+        """Report whether a result is still pending, stored or unknown
+
+        Results queued in this process are found in memory, and stored ones
+        in storage, whichever process wrote them. A recent id found in
+        neither may still be queued by another worker, so it is reported
+        pending without a score until PENDING_GRACE has passed.
+        """
+        with self._pending_lock:
+            pending = self._pending.get(result_id)
+        if pending is not None:
+            return {'status': 'pending', 'result_id': result_id, 'score': pending['score']}
+
+        # The writer stores a batch before dropping it from pending, so checking in this order misses nothing
+        stored = self.data_manager.get_result(result_id)
+        if stored is not None:
+            return {'status': 'stored', 'result_id': result_id, 'score': stored['score']}
+
+        accepted_at = _accepted_at(result_id)
+        if accepted_at is not None and 0 <= time.time() - accepted_at <= PENDING_GRACE:
+            return {'status': 'pending', 'result_id': result_id}
+        return {'status': 'unknown', 'result_id': result_id}
+
+    @property
+    def pending_count(self) -> int:
+        """Number of accepted results not yet stored"""
+        with self._pending_lock:
+            return len(self._pending)
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop accepting submissions and flush what's queued, waiting at most timeout seconds"""
+        if self._stopping:
+            return
+        self._stopping = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # A full queue means the writer is stuck behind storage; don't hang shutdown on it
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Submission writer is backlogged; {self.pending_count} results left unstored at shutdown")
+            return
+        self._thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            logger.error(f"Submission writer still storing {self.pending_count} results after {timeout}s; giving up")
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Dict]):
+        """Store a batch, retrying until storage accepts it"""
+        started = time.perf_counter()
+        while True:
+            try:
+                if self.data_manager.save_results(batch):
+                    break
+                logger.error(f"Storage rejected a batch of {len(batch)} results; retrying")
+            except Exception as e:
+                logger.error(f"Error storing a batch of {len(batch)} results: {e}")
+            time.sleep(RETRY_DELAY)
+        INGESTION_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        INGESTION_BATCH_SIZE.observe(len(batch))
+
+        with self._pending_lock:
+            for result in batch:
+                self._pending.pop(result['id'], None)
@@ -2,14 +2,21 @@
 """
 Main entry point for the Telegram Bot Web App
 Runs both the Telegram bot and Flask web server
+
+Serving modes (--mode or SERVER_MODE):
+  dev         Werkzeug development server in a thread next to the bot
+  production  Flask under gunicorn worker processes; the bot runs in its own process
+
+Roles (--role or APP_ROLE) select what this process runs: all, web or bot.
 """
 
+import argparse
 import asyncio
+import subprocess
+import sys
 import threading
 import os
 import logging
-from bot import start_bot
-from web_app import create_app
 
 # Configure logging
 logging.basicConfig(
@@ -18,29 +25,135 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SERVER_MODES = ('dev', 'production')
+ROLES = ('all', 'web', 'bot')
+
 
-def run_flask_app():
+def parse_args(argv=None):
+    """Command line options, defaulting to environment variables"""
+    parser = argparse.ArgumentParser(description="Telegram Bot Web App")
+    parser.add_argument('--mode', choices=SERVER_MODES, default=os.getenv("SERVER_MODE", "dev"),
+                        help="dev server or production WSGI server (SERVER_MODE)")
+    parser.add_argument('--role', choices=ROLES, default=os.getenv("APP_ROLE", "all"),
+                        help="run the web app, the bot, or both (APP_ROLE)")
+    parser.add_argument('--host', default=os.getenv("WEB_HOST", "0.0.0.0"),
+                        help="address to bind the web app to (WEB_HOST)")
+    parser.add_argument('--port', type=int, default=int(os.getenv("WEB_PORT", "5000")),
+                        help="port to bind the web app to (WEB_PORT)")
+    parser.add_argument('--workers', type=int, default=int(os.getenv("WEB_WORKERS", "0")),
+                        help="production worker processes, 0 for 2 x CPUs + 1 (WEB_WORKERS)")
+    parser.add_argument('--threads', type=int, default=int(os.getenv("WEB_THREADS", "4")),
+                        help="request threads per production worker (WEB_THREADS)")
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="seconds to finish in-flight work on shutdown (GRACEFUL_TIMEOUT)")
+    args = parser.parse_args(argv)
+    if args.workers <= 0:
+        args.workers = (os.cpu_count() or 1) * 2 + 1
+    return args
+
+
+def run_flask_app(host='0.0.0.0', port=5000, data_manager=None):
     """Run the Flask web application in a separate thread"""
-    app = create_app()
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+    from web_app import create_app
+    app = create_app(data_manager)
+    app.run(host=host, port=port, debug=False, use_reloader=False)
 
 
-async def main():
+def run_bot():
+    """Run the Telegram bot until it is stopped"""
+    from bot import start_bot
+    try:
+        asyncio.run(start_bot())
+    except KeyboardInterrupt:
+        pass
+
+
+async def main(args=None):
     """Main function to start both bot and web app"""
+    from bot import start_bot
+    from data_manager import DataManager
+
+    args = args or parse_args([])
     logger.info("Starting Telegram Bot Web App...")
+    # One DataManager for both, so their caches and stats agree
+    data_manager = DataManager()
 
     # Start Flask app in a separate thread
-    flask_thread = threading.Thread(target=run_flask_app, daemon=True)
+    flask_thread = threading.Thread(target=run_flask_app, args=(args.host, args.port, data_manager), daemon=True)
     flask_thread.start()
-    logger.info("Flask web app started on port 5000")
+    logger.info(f"Flask web app started on port {args.port}")
 
     # Start the Telegram bot
-    await start_bot()
+    await start_bot(data_manager)
+
+
+def run_production(args):
+    """Serve the web app from gunicorn workers, with the bot in a separate process"""
+    from gunicorn.app.base import BaseApplication
+
+    bot_process = None
+
+    def start_bot_process(arbiter):
+        nonlocal bot_process
+        # A fresh interpreter, so the bot shares no state with the arbiter or its workers
+        bot_process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--role', 'bot'])
+        logger.info(f"Telegram bot started in process {bot_process.pid}")
+
+    def stop_bot_process(arbiter):
+        if bot_process is None or bot_process.poll() is not None:
+            return
+        logger.info("Stopping Telegram bot...")
+        bot_process.terminate()
+        try:
+            bot_process.wait(args.graceful_timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Telegram bot did not stop in time; killing it")
+            bot_process.kill()
+            bot_process.wait()
+
+    class WebServer(BaseApplication):
+        """gunicorn application that builds the Flask app inside each worker"""
+
+        def load_config(self):
+            options = {
+                'bind': f"{args.host}:{args.port}",
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'graceful_timeout': args.graceful_timeout,
+                # Each worker owns its storage handles and submission queue
+                'preload_app': False,
+            }
+            if args.role == 'all':
+                options['when_ready'] = start_bot_process
+                options['on_exit'] = stop_bot_process
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from web_app import create_app
+            return create_app()
+
+    logger.info(f"Starting production web server on {args.host}:{args.port} "
+                f"with {args.workers} workers x {args.threads} threads")
+    WebServer().run()
+
+
+def run(args):
+    """Start the processes selected by the mode and role"""
+    if args.role == 'bot':
+        run_bot()
+    elif args.mode == 'production':
+        run_production(args)
+    elif args.role == 'web':
+        run_flask_app(args.host, args.port)
+    else:
+        asyncio.run(main(args))
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(parse_args())
     except KeyboardInterrupt:
         logger.info("Application stopped by user")
     except Exception as e:
@@ -0,0 +1,354 @@
+"""
+Metrics Module
+In-process latency histograms, counters and gauges with Prometheus text exposition
+"""
+
+import cProfile
+import functools
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, from sub-millisecond cache hits to multi-second exports
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds for batch sizes
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Fraction of web requests run under cProfile; 0 disables profiling
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Slowest requests kept for /admin/metrics/slow
+SLOW_REQUESTS_KEPT = int(os.getenv("SLOW_REQUESTS_KEPT", "20"))
+# Functions listed per profiled request
+PROFILE_TOP_FUNCTIONS = 15
+
+LabelKey = Tuple[Tuple[str, Any], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    # Values are stringified at render time, keeping the hot path to one sort of a few names
+    return tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items())
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label key -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        """Record one value"""
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self, extra: LabelKey = ()) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in sorted(series, key=lambda item: repr(item[0])):
+            key += extra
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, extra: LabelKey = ()) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items(), key=lambda item: repr(item[0]))
+        return [f"{self.name}{_format_labels(key + extra)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Last observed value per label set"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class MetricsRegistry:
+    """Every metric this process exposes"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge(name, help_text))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format
+
+        Every series carries a pid label: each worker process keeps its own
+        registry, so series from different workers behind one address stay
+        apart instead of appearing to reset whenever another worker answers.
+        """
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        # Read at render time; preloaded workers fork after import
+        extra = (('pid', os.getpid()),)
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(extra))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "webbot_http_request_duration_seconds", "Web request latency by endpoint, method and status")
+SUBMIT_STAGE_SECONDS = registry.histogram(
+    "webbot_submit_stage_duration_seconds", "Time /api/submit_test spends in each stage")
+DATA_MANAGER_SECONDS = registry.histogram(
+    "webbot_data_manager_duration_seconds", "DataManager call latency by method")
+STORAGE_SECONDS = registry.histogram(
+    "webbot_storage_duration_seconds", "Storage file and database operation latency")
+STORAGE_FILE_BYTES = registry.gauge(
+    "webbot_storage_file_bytes", "Size of each JSON data file when last read or written")
+INGESTION_BATCH_SIZE = registry.histogram(
+    "webbot_ingestion_batch_size", "Results stored per ingestion batch", SIZE_BUCKETS)
+INGESTION_FLUSH_SECONDS = registry.histogram(
+    "webbot_ingestion_flush_duration_seconds", "Time to store one ingestion batch")
+BOT_HANDLER_SECONDS = registry.histogram(
+    "webbot_bot_handler_duration_seconds", "Bot handler latency by event type and handler")
+BOT_HANDLER_ERRORS = registry.counter(
+    "webbot_bot_handler_errors_total", "Bot handler calls that raised")
+EVENT_LOOP_LAG_SECONDS = registry.histogram(
+    "webbot_event_loop_lag_seconds", "How late the bot's event loop woke each lag probe")
+EVENT_LOOP_LAG_MAX_SECONDS = registry.gauge(
+    "webbot_event_loop_lag_max_seconds", "Largest event loop lag seen since the bot started")
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator observing each call's duration"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+class BotMetricsMiddleware:
+    """aiogram middleware timing every handler call; register it on each observer the bot uses"""
+
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            BOT_HANDLER_ERRORS.inc(event_type=self.event_type, handler=name)
+            raise
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, event_type=self.event_type, handler=name)
+
+
+class SlowRequestProfiler:
+    """Profiles a sample of requests and keeps the slowest ones with their hottest functions
+
+    Only one request is profiled at a time, since a profiler hooks the
+    whole interpreter; sampled requests that find it busy run unprofiled.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, keep: int = SLOW_REQUESTS_KEPT):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        # Min-heap of (duration, sequence, record), so the fastest kept request is evicted first
+        self._slowest: List[tuple] = []
+        self._sequence = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Profiler for the current request if it was sampled, else None"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active in this interpreter
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler: cProfile.Profile, duration: float, description: Dict):
+        """Stop a profiler and keep its report if the request is among the slowest"""
+        profiler.disable()
+        self._busy.release()
+        with self._lock:
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0][0]:
+                return
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        record = dict(description, duration_ms=round(duration * 1000, 3),
+                      at=time.strftime('%Y-%m-%dT%H:%M:%S'), profile=output.getvalue())
+        with self._lock:
+            self._sequence += 1
+            entry = (duration, self._sequence, record)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self) -> List[Dict]:
+        """Kept requests, slowest first"""
+        with self._lock:
+            return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+
+def init_app(app):
+    """Time every request of a Flask app and profile a sample of them"""
+    from flask import g, request
+
+    profiler = SlowRequestProfiler()
+    app.extensions['request_profiler'] = profiler
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_profiler = profiler.start()
+
+    @app.after_request
+    def _stop_timer_on_close(response):
+        started = g.pop('metrics_started', None)
+        active_profiler = g.pop('metrics_profiler', None)
+        if started is None:
+            return response
+        labels = {
+            'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+            'method': request.method,
+            'status': response.status_code
+        }
+        path = request.full_path.rstrip('?')
+
+        # Runs once the server has sent the body, so streamed exports are timed in full
+        def finish():
+            duration = time.perf_counter() - started
+            HTTP_REQUEST_SECONDS.observe(duration, **labels)
+            if active_profiler is not None:
+                profiler.finish(active_profiler, duration, dict(labels, path=path))
+
+        response.call_on_close(finish)
+        return response
+
+    @app.teardown_request
+    def _release_profiler(error=None):
+        # after_request didn't run; don't leave the interpreter profiled
+        active_profiler = g.pop('metrics_profiler', None)
+        if active_profiler is not None:
+            started = g.pop('metrics_started', time.perf_counter())
+            profiler.finish(active_profiler, time.perf_counter() - started,
+                            {'method': request.method, 'path': request.full_path.rstrip('?'), 'status': 500})
+
+    return profiler
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics over HTTP from an asyncio process such as the bot; returns the runner to clean up"""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+One-shot migration from the JSON data files to the SQLite backend
+Usage: python migrate_to_sqlite.py [data_dir]
+"""
+
+import sys
+from storage import JSONStorage, SQLiteStorage, draft_from_record
+
+
+def migrate(data_dir: str = "data") -> dict:
+    """Copy tests, users, results, admins and in-progress drafts from JSON files into SQLite"""
+    source = JSONStorage(data_dir)
+    target = SQLiteStorage(data_dir)
+
+    counts = {'tests': 0, 'users': 0, 'results': 0, 'admins': 0, 'drafts': 0}
+
+    for test in source.get_all_tests():
+        target.save_test(test)
+        counts['tests'] += 1
+
+    for user in source.load_json(source.users_file).values():
+        target.save_user(user)
+        counts['users'] += 1
+
+    results = list(source.iter_results())
+    target.add_results(results)
+    counts['results'] = len(results)
+
+    for admin in source.load_json(source.admins_file).values():
+        target.save_admin(admin)
+        counts['admins'] += 1
+
+    # Drafts go in as one batch of changes; an empty cutoff expires none of them
+    drafts = [draft_from_record(draft) for draft in source.load_json(source.drafts_file).values()]
+    target.update_drafts({(draft['user_id'], draft['test_code']): draft for draft in drafts}, [], '')
+    counts['drafts'] = len(drafts)
+
+    return counts
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    counts = migrate(data_dir)
+    print(f"Migrated {counts['tests']} tests, {counts['users']} users, {counts['results']} results, "
+          f"{counts['admins']} admins and {counts['drafts']} drafts into {data_dir}/webbot.db")
+    print("Set STORAGE_BACKEND=sqlite to use the SQLite backend.")
@@ -0,0 +1,246 @@
+"""
+Scoring Module
+Answer keys compiled into flat arrays for fast single and batch scoring
+"""
+
+from itertools import chain, repeat
+from operator import add, attrgetter, eq
+from typing import Dict, List, Optional, Any, Sequence
+
+from answer_codec import MISSING, PackedAnswers, packed_columns
+
+# Joins the two parts of a text answer into one comparable slot value
+PART_SEPARATOR = '\x1f'
+# Unanswered choice values swapped for MISSING when a plain column is joined into a str
+_MISSING_FOR_BLANK = {None: MISSING, '': MISSING}
+
+
+def normalize_answer(value: Any) -> str:
+    """Normalize a submitted or expected answer for comparison"""
+    if value is None:
+        return ''
+    return str(value).strip().upper()
+
+
+def _slot_value(value: Any) -> str:
+    """Normalize one answer field; nested dicts never match a plain answer"""
+    return '' if isinstance(value, dict) else normalize_answer(value)
+
+
+def match_column(values: Sequence, expected: Optional[str]) -> bytes:
+    """Compare one answer field across many submissions with its expected value
+
+    Returns one 0/1 flag byte per submission. Only the distinct raw values
+    are normalized; a packed choice column (a str of one character per row)
+    is then flagged with one bytes.translate, any other column with a set
+    membership test run by map(), neither with a Python-level loop.
+    """
+    if expected is None:
+        return bytes(len(values))
+    try:
+        matching = {value for value in set(values) if _slot_value(value) == expected}
+    except TypeError:
+        # Unhashable answers in this column; compare row by row
+        return bytes(_slot_value(value) == expected for value in values)
+    if isinstance(values, str) and values.isascii():
+        return values.encode('ascii').translate(bytes(chr(code) in matching for code in range(256)))
+    return bytes(map(matching.__contains__, values))
+
+
+def _choice_string(values: List) -> Sequence:
+    """A choice column as a str of one character per row, like a packed one, when it fits
+
+    Unanswered values (None or '') become MISSING, which normalizes the same
+    way, so the joined length only matches when every answer is one character.
+    """
+    try:
+        joined = ''.join(map(_MISSING_FOR_BLANK.get, values, values))
+    except TypeError:
+        return values
+    return joined if len(joined) == len(values) else values
+
+
+def both_flags(first: bytes, second: bytes) -> bytes:
+    """Row-wise AND of two flag columns, as one big-integer operation"""
+    return (int.from_bytes(first, 'little') & int.from_bytes(second, 'little')).to_bytes(len(first), 'little')
+
+
+def row_totals(matrix: List[bytes], rows: int) -> Sequence[int]:
+    """Flags set per row across flag columns
+
+    Each column is read as one big integer holding a byte per row, so adding
+    the integers adds every row at once; no carry crosses a row while a
+    total fits in a byte.
+    """
+    if len(matrix) < 256:
+        return sum(int.from_bytes(column, 'little') for column in matrix).to_bytes(rows, 'little')
+    totals = [0] * rows
+    for column in matrix:
+        totals = list(map(add, totals, column))
+    return totals
+
+
+class CompiledScorer:
+    """Answer key flattened into one expected value per question slot"""
+
+    def __init__(self, answer_key: Dict):
+        self.answer_key = answer_key
+        self.questions: List[str] = []
+        self.text_slots: List[bool] = []
+        self.expected: List[Optional[str]] = []
+        # (part A, part B) for text slots, used by the column-wise batch path
+        self.expected_parts: List[Optional[tuple]] = []
+
+        for question_num, correct_answer in answer_key.items():
+            question_num = str(question_num)
+            self.questions.append(question_num)
+            if isinstance(correct_answer, dict):
+                # Text questions with parts A and B; a malformed key can't be matched
+                self.text_slots.append(True)
+                if 'A' in correct_answer and 'B' in correct_answer:
+                    parts = (normalize_answer(correct_answer['A']), normalize_answer(correct_answer['B']))
+                    self.expected.append(parts[0] + PART_SEPARATOR + parts[1])
+                    self.expected_parts.append(parts)
+                else:
+                    self.expected.append(None)
+                    self.expected_parts.append(None)
+            else:
+                self.text_slots.append(False)
+                self.expected.append(normalize_answer(correct_answer))
+                self.expected_parts.append(None)
+
+        self.total_questions = len(self.questions)
+        self._slots = list(zip(self.questions, self.text_slots))
+        # Every answer field a submission may use, text parts in both forms
+        self._fields = self.questions + [f"{question_num}{part}"
+                                         for question_num, is_text in self._slots if is_text
+                                         for part in ('A', 'B')]
+
+    def extract(self, answers: Dict) -> List[str]:
+        """Read a submission into normalized values aligned with the answer key
+
+        Text parts are accepted both flat ("36A") and nested ({"36": {"A": ...}}).
+        """
+        get = answers.get
+        values = []
+        for question_num, is_text in self._slots:
+            if is_text:
+                nested = get(question_num)
+                if isinstance(nested, dict):
+                    part_a, part_b = nested.get('A'), nested.get('B')
+                else:
+                    part_a, part_b = get(f"{question_num}A"), get(f"{question_num}B")
+                values.append(normalize_answer(part_a) + PART_SEPARATOR + normalize_answer(part_b))
+            else:
+                values.append(_slot_value(get(question_num)))
+        return values
+
+    def columns(self, submissions: List[Dict]) -> Dict[Any, Sequence]:
+        """Raw answer fields across many submissions, one sequence per field
+
+        Every row is read with a C-level map(answers.get, fields) into one
+        flat list, so each field's column is a strided slice of it and the
+        per-submission work stays out of the interpreter loop; choice columns
+        are then joined into strs where they fit. Stored (packed) answers are
+        transposed straight from their rows, with text parts already split
+        out under part_column's memo keys.
+        """
+        fields = self._fields
+        if not submissions:
+            return {field: () for field in fields}
+        if set(map(type, submissions)) == {PackedAnswers}:
+            return packed_columns(submissions, self._slots)
+        values = list(chain.from_iterable(map(map, map(attrgetter('get'), submissions), repeat(fields))))
+        columns = {field: values[index::len(fields)] for index, field in enumerate(fields)}
+        for question_num, is_text in self._slots:
+            if not is_text:
+                columns[question_num] = _choice_string(columns[question_num])
+        return columns
+
+    def part_column(self, columns: Dict[Any, Sequence], question_num: str, part: str) -> Sequence:
+        """Values of one text-question part, whether submitted nested or flat
+
+        Both parts' merged columns are memoized in columns under (question,
+        part) keys, so the nested column's value types are scanned once.
+        """
+        memo_key = (question_num, part)
+        if memo_key in columns:
+            return columns[memo_key]
+
+        nested = columns[question_num]
+        value_types = set(map(type, nested))
+        for each_part in ('A', 'B'):
+            flat = columns[f"{question_num}{each_part}"]
+            if dict not in value_types:
+                values = flat
+            elif value_types == {dict}:
+                values = tuple(map(dict.get, nested, repeat(each_part)))
+            else:
+                values = [value.get(each_part) if isinstance(value, dict) else flat_value
+                          for value, flat_value in zip(nested, flat)]
+            columns[(question_num, each_part)] = values
+        return columns[memo_key]
+
+    def correct_matrix(self, submissions: List[Dict], columns: Optional[Dict[Any, Sequence]] = None) -> List[bytes]:
+        """Per-question columns of 0/1 correct flags across submissions, one byte per submission"""
+        if columns is None:
+            columns = self.columns(submissions)
+        matrix = []
+        for question_num, is_text, expected, parts in zip(self.questions, self.text_slots,
+                                                          self.expected, self.expected_parts):
+            if not is_text:
+                matrix.append(match_column(columns[question_num], expected))
+            elif parts is None:
+                matrix.append(bytes(len(submissions)))
+            else:
+                matrix.append(both_flags(match_column(self.part_column(columns, question_num, 'A'), parts[0]),
+                                         match_column(self.part_column(columns, question_num, 'B'), parts[1])))
+        return matrix
+
+    def breakdown(self, answers: Dict) -> List[Dict]:
+        """Per-question submitted answer, correct answer and whether they match"""
+        get = answers.get
+        rows = []
+        for (question_num, is_text), correct_answer, value, expected in zip(
+                self._slots, self.answer_key.values(), self.extract(answers), self.expected):
+            if is_text:
+                nested = get(question_num)
+                if isinstance(nested, dict):
+                    submitted = {part: nested.get(part) for part in ('A', 'B')}
+                else:
+                    submitted = {part: get(f"{question_num}{part}") for part in ('A', 'B')}
+            else:
+                submitted = get(question_num)
+            rows.append({
+                'question': question_num,
+                'type': 'text' if is_text else 'multiple_choice',
+                'answer': submitted,
+                'correct_answer': correct_answer,
+                'correct': value == expected
+            })
+        return rows
+
+    def correct_count(self, answers: Dict) -> int:
+        """Number of questions answered correctly"""
+        return sum(map(eq, self.extract(answers), self.expected))
+
+    def score(self, answers: Dict) -> float:
+        """Percentage score for one submission"""
+        if not self.total_questions or not answers:
+            return 0.0
+        return (self.correct_count(answers) / self.total_questions) * 100
+
+    def score_many(self, submissions: List[Dict], matrix: Optional[List[bytes]] = None) -> List[float]:
+        """Percentage scores for many submissions, computed one question column at a time
+
+        Pass the submissions' correct_matrix() when the caller already has it.
+        """
+        if not self.total_questions:
+            return [0.0] * len(submissions)
+
+        if matrix is None:
+            matrix = self.correct_matrix(submissions)
+        counts = row_totals(matrix, len(submissions))
+        total = self.total_questions
+        return [(count / total) * 100 if answers else 0.0
+                for count, answers in zip(counts, submissions)]
@@ -530,17 +530,20 @@ function showTestDetails(test) {
 
     let answerKeyHtml = '<h6>Answer Key:</h6><div class="row">';
 
-    for (const [questionNum, answer] of Object.entries(test.answer_key)) {
+    for (const question of test.questions) {
+        const answer = question.correct_answer;
+        const answered = question.correct + question.incorrect;
+        const rate = answered ? ` <small class="text-muted">${question.correct}/${answered} correct</small>` : '';
         if (typeof answer === 'object') {
             answerKeyHtml += `
                 <div class="col-md-6 mb-2">
-                    <strong>Q${questionNum}:</strong> A: ${answer.A}, B: ${answer.B}
+                    <strong>Q${question.question}:</strong> A: ${answer.A}, B: ${answer.B}${rate}
                 </div>
             `;
         } else {
             answerKeyHtml += `
                 <div class="col-md-3 mb-2">
-                    <strong>Q${questionNum}:</strong> ${answer}
+                    <strong>Q${question.question}:</strong> ${answer}${rate}
                 </div>
             `;
         }
@@ -557,6 +560,7 @@ function showTestDetails(test) {
                 </span>
             </p>
             <p><strong>Questions:</strong> ${test.total_questions}</p>
+            <p><strong>Submissions:</strong> ${test.submissions}</p>
             <p><strong>Time Limit:</strong> ${test.time_limit || 'No limit'}</p>
             <p><strong>Created:</strong> ${test.created_at}</p>
             <p><strong>Created by:</strong> ${test.created_by}</p>
@@ -636,24 +640,149 @@ function setupResultsFilters() {
     }
 }
 
-function filterResults() {
+// Cursors of the pages visited so far; the last one is the page on screen
+let resultsCursors = [null];
+let resultsNextCursor = null;
+let resultsSearchTimer = null;
+
+function filterResults(event) {
+    const testCode = document.getElementById('testFilter')?.value || '';
+    const params = resultsFilterParams();
+
+    // A different test changes the summary cards, so reload the page for it
+    if (testCode !== (new URLSearchParams(window.location.search).get('test_code') || '')) {
+        window.location.href = `/admin/results?${params.toString()}`;
+        return;
+    }
+
+    window.history.replaceState(null, '', `/admin/results?${params.toString()}`);
+    clearTimeout(resultsSearchTimer);
+    const delay = event && event.target?.id === 'searchResults' ? 300 : 0;
+    resultsSearchTimer = setTimeout(() => {
+        resultsCursors = [null];
+        loadResultsPage();
+    }, delay);
+}
+
+function resultsFilterParams() {
+    const params = new URLSearchParams();
     const testCode = document.getElementById('testFilter')?.value || '';
     const scoreRange = document.getElementById('scoreFilter')?.value || '';
     const dateRange = document.getElementById('dateFilter')?.value || '';
-    const searchTerm = document.getElementById('searchResults')?.value.toLowerCase() || '';
+    const searchTerm = document.getElementById('searchResults')?.value.trim() || '';
 
-    // Redirect with filters for server-side filtering
-    const params = new URLSearchParams();
     if (testCode) params.set('test_code', testCode);
     if (scoreRange) params.set('score_range', scoreRange);
     if (dateRange) params.set('date_range', dateRange);
     if (searchTerm) params.set('search', searchTerm);
+    return params;
+}
 
-    window.location.href = `/admin/results?${params.toString()}`;
+function resultsApiParams() {
+    const filters = resultsFilterParams();
+    const params = new URLSearchParams();
+    if (filters.has('test_code')) params.set('test_code', filters.get('test_code'));
+    if (filters.has('search')) params.set('search', filters.get('search'));
+
+    if (filters.has('score_range')) {
+        // "80-89" covers 80 <= score < 90; the top range has no upper bound
+        const [low, high] = filters.get('score_range').split('-').map(Number);
+        params.set('min_score', low);
+        if (high < 100) params.set('max_score', high + 1);
+    }
+
+    if (filters.has('date_range')) {
+        const start = new Date();
+        if (filters.get('date_range') === 'week') {
+            start.setDate(start.getDate() - ((start.getDay() + 6) % 7));
+        } else if (filters.get('date_range') === 'month') {
+            start.setDate(1);
+        }
+        const pad = n => String(n).padStart(2, '0');
+        params.set('date_from', `${start.getFullYear()}-${pad(start.getMonth() + 1)}-${pad(start.getDate())}`);
+    }
+    return params;
 }
 
 function loadResultsTable() {
-    // Additional results table functionality
+    loadResultsPage();
+}
+
+async function loadResultsPage() {
+    const body = document.getElementById('resultsBody');
+    if (!body) return;
+
+    const params = resultsApiParams();
+    const cursor = resultsCursors[resultsCursors.length - 1];
+    if (cursor) params.set('cursor', cursor);
+
+    try {
+        const response = await fetch(`/admin/api/results?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error('Failed to load results');
+        }
+        const page = await response.json();
+        resultsNextCursor = page.next_cursor;
+        renderResultsPage(page.results);
+    } catch (error) {
+        console.error('Error loading results:', error);
+        showAlert('Error loading results', 'danger');
+    }
+}
+
+function renderResultsPage(results) {
+    const body = document.getElementById('resultsBody');
+    body.innerHTML = results.map(result => {
+        const score = result.score;
+        const grade = score >= 90 ? ['A', 'success'] : score >= 80 ? ['B', 'info'] :
+            score >= 70 ? ['C', 'warning'] : score >= 60 ? ['D', 'secondary'] : ['F', 'danger'];
+        return `
+            <tr>
+                <td>
+                    <strong>${escapeHtml(result.user_name || 'Unknown User')}</strong>
+                    <br><small class="text-muted">ID: ${result.user_id}</small>
+                </td>
+                <td>
+                    <span class="badge bg-secondary">${escapeHtml(result.test_code)}</span>
+                    ${result.test_title ? `<br><small>${escapeHtml(result.test_title)}</small>` : ''}
+                </td>
+                <td><span class="fw-bold">${score.toFixed(1)}%</span></td>
+                <td><span class="badge bg-${grade[1]}">${grade[0]}</span></td>
+                <td>${result.submitted_at.slice(0, 10)}</td>
+                <td>${result.submitted_at.slice(11, 16)}</td>
+                <td>
+                    <button type="button" class="btn btn-sm btn-outline-primary" onclick="viewDetailedResult('${escapeHtml(result.id)}')">
+                        <i class="bi bi-eye me-1"></i>Details
+                    </button>
+                </td>
+            </tr>
+        `;
+    }).join('');
+
+    const firstPage = resultsCursors.length === 1;
+    document.getElementById('resultsTable').classList.toggle('d-none', results.length === 0);
+    document.getElementById('resultsEmpty').classList.toggle('d-none', results.length > 0 || !firstPage);
+    document.getElementById('resultsPrev').disabled = firstPage;
+    document.getElementById('resultsNext').disabled = !resultsNextCursor;
+    document.getElementById('resultsPageInfo').textContent = `(page ${resultsCursors.length})`;
+}
+
+function nextResultsPage() {
+    if (!resultsNextCursor) return;
+    resultsCursors.push(resultsNextCursor);
+    loadResultsPage();
+}
+
+function previousResultsPage() {
+    if (resultsCursors.length === 1) return;
+    resultsCursors.pop();
+    loadResultsPage();
+}
+
+function escapeHtml(value) {
+    return String(value).replace(/[&<>"']/g, char => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[char]);
 }
 
 async function viewDetailedResult(resultId) {
@@ -677,12 +806,22 @@ function showResultDetails(result) {
 
     let answersHtml = '<h6>Student Answers:</h6><div class="row">';
 
-    for (const [questionNum, answer] of Object.entries(result.answers)) {
+    // Without its test (deleted) a result's answers can't be marked
+    const questions = result.questions.length ? result.questions :
+        Object.entries(result.answers).map(([question, answer]) => ({question, answer, correct: null}));
+
+    for (const question of questions) {
+        const answer = question.answer;
+        const expected = question.correct_answer;
+        const marked = question.correct !== null;
         answersHtml += `
-            <div class="col-md-6 mb-2">
-                <strong>Q${questionNum}:</strong> ${typeof answer === 'object' ? 
-                    `A: ${answer.A || 'N/A'}, B: ${answer.B || 'N/A'}` : 
-                    answer || 'N/A'}
+            <div class="col-md-6 mb-2 ${marked ? (question.correct ? 'text-success' : 'text-danger') : ''}">
+                ${marked ? `<i class="bi bi-${question.correct ? 'check-circle' : 'x-circle'} me-1"></i>` : ''}
+                <strong>Q${escapeHtml(question.question)}:</strong> ${answer && typeof answer === 'object' ?
+                    `A: ${escapeHtml(answer.A || 'N/A')}, B: ${escapeHtml(answer.B || 'N/A')}` :
+                    escapeHtml(answer || 'N/A')}
+                ${!marked || question.correct ? '' : `<small class="text-muted">(correct: ${typeof expected === 'object' ?
+                    `A: ${escapeHtml(expected.A)}, B: ${escapeHtml(expected.B)}` : escapeHtml(expected)})</small>`}
             </div>
         `;
     }
@@ -691,9 +830,9 @@ function showResultDetails(result) {
     content.innerHTML = `
         <div class="mb-3">
             <h5>Result Details</h5>
-            <p><strong>Student:</strong> ${result.user_name || 'Unknown'}</p>
-            <p><strong>Test Code:</strong> ${result.test_code}</p>
-            <p><strong>Score:</strong> ${result.score.toFixed(1)}%</p>
+            <p><strong>Student:</strong> ${escapeHtml(result.user_name || 'Unknown')}</p>
+            <p><strong>Test:</strong> ${escapeHtml(result.test_title)} (${escapeHtml(result.test_code)})</p>
+            <p><strong>Score:</strong> ${result.score.toFixed(1)}%${result.questions.length ? ` (${result.correct_count}/${result.questions.length} correct)` : ''}</p>
             <p><strong>Submitted:</strong> ${result.submitted_at}</p>
         </div>
         ${answersHtml}
@@ -702,74 +841,24 @@ function showResultDetails(result) {
     modal.show();
 }
 
-async function exportResults() {
+function exportResults() {
     const testCode = document.getElementById('testFilter')?.value;
     if (!testCode) {
         alert('Please select a test to export results.');
         return;
     }
 
-    try {
-        const response = await fetch(`/admin/api/export/${testCode}`);
-        const data = await response.json();
-
-        // Convert to CSV and download
-        const csv = convertToCSV(data);
-        downloadCSV(csv, `test_${testCode}_results.csv`);
-    } catch (error) {
-        console.error('Error exporting results:', error);
-        alert('Error exporting results');
-    }
-}
-
-function convertToCSV(data) {
-    if (data.length === 0) return '';
-
-    const headers = ['Student Name', 'User ID', 'Score', 'Submitted Date'];
-    const rows = data.map(result => [
-        result.user_name || 'Unknown',
-        result.user_id,
-        result.score.toFixed(1),
-        result.submitted_at
-    ]);
-
-    return [headers, ...rows].map(row =>
-        row.map(field => `"${field}"`).join(',')
-    ).join('\n');
-}
-
-function downloadCSV(csv, filename) {
-    const blob = new Blob([csv], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.setAttribute('hidden', '');
-    a.setAttribute('href', url);
-    a.setAttribute('download', filename);
-    document.body.appendChild(a);
-    a.click();
-    document.body.removeChild(a);
+    // The server streams the CSV, so let the browser download it directly
+    window.location.href = `/admin/api/export/${testCode}?format=csv`;
 }
 
 function refreshResults() {
     location.reload();
 }
 
-function initializeScoreChart(scores) {
+function initializeScoreDistributionChart(ranges) {
     const ctx = document.getElementById('scoreDistributionChart');
-    if (!ctx || !scores || scores.length === 0) return;
-
-    // Create score ranges
-    const ranges = {
-        '0-20': 0, '21-40': 0, '41-60': 0, '61-80': 0, '81-100': 0
-    };
-
-    scores.forEach(score => {
-        if (score <= 20) ranges['0-20']++;
-        else if (score <= 40) ranges['21-40']++;
-        else if (score <= 60) ranges['41-60']++;
-        else if (score <= 80) ranges['61-80']++;
-        else ranges['81-100']++;
-    });
+    if (!ctx || !ranges) return;
 
     new Chart(ctx, {
         type: 'bar',
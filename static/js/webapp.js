@@ -6,6 +6,12 @@ let timeRemaining = null;
 let timerInterval = null;
 let userData = null;
 
+// Answers changed since the last autosave, sent once the student pauses
+let draftChanges = {};
+let draftTimer = null;
+const DRAFT_SAVE_DELAY = 2000;
+const DRAFT_RETRY_DELAY = 10000;
+
 // Initialize web app
 function initializeWebApp(user, test) {
     userData = user;
@@ -54,6 +60,13 @@ function setupEventListeners() {
         });
     }
 
+    // Save pending answers before Telegram or the browser puts the page away
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') {
+            saveDraft();
+        }
+    });
+
     // Keyboard navigation
     document.addEventListener('keydown', function(e) {
         if (getCurrentScreen() === 'testScreen') {
@@ -90,12 +103,12 @@ async function validateTestCode() {
     showLoading('Validating test code...');
 
     try {
-        // Simulate API call to validate test code
-        const response = await fetch(`/api/validate_test?code=${testCode}&user_id=${userData.id}`);
+        // Public view of the test: details and question layout, no answers
+        const response = await fetch(`/api/test/${encodeURIComponent(testCode)}`);
         const result = await response.json();
 
-        if (result.success) {
-            currentTest = result.test;
+        if (response.ok) {
+            currentTest = result;
             showTestInstructions();
         } else {
             showAlert(result.error || 'Invalid test code', 'danger');
@@ -139,16 +152,27 @@ function startTest() {
     showTestInstructions();
 }
 
-function beginTest() {
+async function beginTest() {
     if (!currentTest) return;
 
     // Initialize test data
     currentQuestionIndex = 0;
     userAnswers = {};
+    draftChanges = {};
+
+    // Pick up an attempt saved before a reload
+    const draft = await loadDraft();
+    if (draft) {
+        userAnswers = draft.answers;
+        showAlert('Your saved answers have been restored.', 'info');
+    } else {
+        // Record the start so a reload resumes the timer where it was
+        postDraft({});
+    }
 
     // Setup timer if time limit exists
     if (currentTest.time_limit) {
-        timeRemaining = currentTest.time_limit * 60; // Convert to seconds
+        timeRemaining = currentTest.time_limit * 60 - (draft ? draft.elapsed_seconds : 0); // Convert to seconds
         setupTimer();
     }
 
@@ -302,12 +326,12 @@ function generateQuestionHTML(questionNum) {
                     <div class="text-part">
                         <label for="q${questionNum}A">Part A</label>
                         <textarea id="q${questionNum}A" placeholder="Enter your answer for Part A..." 
-                                onchange="saveTextAnswer(${questionNum}, 'A', this.value)"></textarea>
+                                oninput="saveTextAnswer(${questionNum}, 'A', this.value)"></textarea>
                     </div>
                     <div class="text-part">
                         <label for="q${questionNum}B">Part B</label>
                         <textarea id="q${questionNum}B" placeholder="Enter your answer for Part B..." 
-                                onchange="saveTextAnswer(${questionNum}, 'B', this.value)"></textarea>
+                                oninput="saveTextAnswer(${questionNum}, 'B', this.value)"></textarea>
                     </div>
                 </div>
             </div>
@@ -315,9 +339,68 @@ function generateQuestionHTML(questionNum) {
     }
 }
 
+function draftUrl() {
+    return `/api/draft/${encodeURIComponent(currentTest.code)}`;
+}
+
+async function loadDraft() {
+    if (!userData) return null;
+    try {
+        const response = await fetch(`${draftUrl()}?user_id=${encodeURIComponent(userData.id)}`);
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        console.error('Error loading saved answers:', error);
+        return null;
+    }
+}
+
+function postDraft(changes) {
+    // keepalive lets a save started as the page is hidden finish after it closes
+    return fetch(draftUrl(), {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            user_id: userData.id,
+            answers: changes
+        }),
+        keepalive: true
+    });
+}
+
+function queueDraftSave(questionNum) {
+    draftChanges[questionNum] = userAnswers[questionNum] ?? null;
+    clearTimeout(draftTimer);
+    draftTimer = setTimeout(saveDraft, DRAFT_SAVE_DELAY);
+}
+
+async function saveDraft() {
+    clearTimeout(draftTimer);
+    draftTimer = null;
+    if (!currentTest || !userData || Object.keys(draftChanges).length === 0) return;
+
+    const changes = draftChanges;
+    draftChanges = {};
+    try {
+        const response = await postDraft(changes);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+    } catch (error) {
+        console.error('Error saving answers:', error);
+        // Keep the unsaved changes, under anything newer, and try again later
+        draftChanges = Object.assign(changes, draftChanges);
+        if (!draftTimer) {
+            draftTimer = setTimeout(saveDraft, DRAFT_RETRY_DELAY);
+        }
+    }
+}
+
 function selectMCOption(questionNum, option) {
     // Save answer
     userAnswers[questionNum] = option;
+    queueDraftSave(questionNum);
 
     // Update UI
     const options = document.querySelectorAll(`input[name="q${questionNum}"]`);
@@ -341,6 +424,7 @@ function saveTextAnswer(questionNum, part, value) {
         userAnswers[questionNum] = {};
     }
     userAnswers[questionNum][part] = value.trim();
+    queueDraftSave(questionNum);
 
     updateNavigationButtons();
     updateProgressBar();
@@ -465,6 +549,11 @@ async function submitTest() {
     const submitModal = bootstrap.Modal.getInstance(document.getElementById('submitModal'));
     if (submitModal) submitModal.hide();
 
+    // The submission carries every answer and the server then drops the draft,
+    // so a late autosave must not recreate it
+    clearTimeout(draftTimer);
+    draftChanges = {};
+
     // Show loading
     showLoading('Submitting your test...');
 
@@ -0,0 +1,341 @@
+"""
+Statistics Module
+Dashboard aggregates maintained incrementally as data changes
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scoring import CompiledScorer
+from storage import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+SCORE_BUCKETS = ['0-20', '21-40', '41-60', '61-80', '81-100']
+
+# Per-test summary thresholds shown on the results page
+HIGH_SCORE = 80
+LOW_SCORE = 60
+
+# Minimum seconds between snapshot writes while aggregates are changing
+SNAPSHOT_INTERVAL = 30
+
+
+def score_bucket(score: float) -> str:
+    """Score distribution bucket for a percentage score"""
+    if score <= 20:
+        return '0-20'
+    elif score <= 40:
+        return '21-40'
+    elif score <= 60:
+        return '41-60'
+    elif score <= 80:
+        return '61-80'
+    return '81-100'
+
+
+class StatsAggregator:
+    """Counters, sums and histogram buckets for the admin dashboard
+
+    Results are folded in through the storage backend's results_since()
+    cursor, so submissions saved by other processes are picked up by
+    reading only the records added since the last update. The aggregates
+    and their cursor are snapshotted to disk so startup doesn't rescan
+    every result.
+
+    Re-graded scores don't move the cursor, so a rescore bumps a generation
+    counter in a file shared by every process; a process that finds it
+    changed rebuilds. Test titles and active flags are reloaded whenever
+    the storage's tests signature changes.
+
+    Per-question correct counts are folded in the same way, under the
+    answer key they were counted against; after the key changes they are
+    recounted from the test's results the next time they are read.
+    """
+
+    def __init__(self, storage, snapshot_file: str, backend: str,
+                 scorer_for: Callable[[str], Optional[CompiledScorer]] = lambda test_code: None):
+        self.storage = storage
+        # Compiled scorer for a test code, or None once the test is deleted
+        self.scorer_for = scorer_for
+        self.snapshot_file = snapshot_file
+        self.generation_file = f"{os.path.splitext(snapshot_file)[0]}.generation"
+        self.backend = backend
+        self.lock = threading.RLock()
+        self._dirty = False
+        self._last_snapshot = 0.0
+        self._tests_signature = None
+
+        self._reset()
+        self._sync_tests()
+        if not self._load_snapshot():
+            self.rebuild()
+        else:
+            self.catch_up()
+
+    def _reset(self):
+        self.generation = self._read_generation()
+        self.cursor = 0
+        self.total_submissions = 0
+        self.score_sum = 0.0
+        self.score_distribution = dict.fromkeys(SCORE_BUCKETS, 0)
+        self.test_submissions: Dict[str, int] = {}
+        # Per-test score sum, high/low counts and distribution
+        self.test_scores: Dict[str, Dict] = {}
+        # Per-test {'answer_key': ..., 'counts': [...]} of correct answers per question
+        self.question_correct: Dict[str, Dict] = {}
+
+    def _sync_tests(self):
+        """Reload test titles and active flags from storage"""
+        # Read before the tests, so a change made in between is picked up next time
+        self._tests_signature = self.storage.tests_signature()
+        self.tests = {test['code']: {'title': test.get('title'), 'active': bool(test.get('active', False))}
+                      for test in self.storage.get_all_tests()}
+
+    def _read_generation(self) -> int:
+        """Shared rescore counter, 0 until the first rescore"""
+        try:
+            with open(self.generation_file, 'r', encoding='utf-8') as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_generation(self):
+        """Tell other processes their aggregates hold outdated scores"""
+        with FileLock.for_path(self.generation_file):
+            current = self._read_generation()
+            try:
+                atomic_write(self.generation_file, lambda f: f.write(str(current + 1)))
+            except Exception as e:
+                logger.error(f"Error saving stats generation to {self.generation_file}: {e}")
+                return
+        # A rescore elsewhere since our last check isn't in our aggregates yet;
+        # leaving our generation behind makes the next catch_up rebuild
+        if current == self.generation:
+            self.generation = current + 1
+            self._changed()
+
+    def _load_snapshot(self) -> bool:
+        """Restore aggregates from the snapshot file, returning False if unusable"""
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        if snapshot.get('backend') != self.backend or 'test_scores' not in snapshot:
+            return False
+
+        self.generation = snapshot.get('generation', 0)
+        self.cursor = snapshot['cursor']
+        self.total_submissions = snapshot['total_submissions']
+        self.score_sum = snapshot['score_sum']
+        self.score_distribution = dict(dict.fromkeys(SCORE_BUCKETS, 0), **snapshot['score_distribution'])
+        self.test_submissions = snapshot['test_submissions']
+        self.test_scores = snapshot['test_scores']
+        self.question_correct = snapshot.get('question_correct', {})
+        return True
+
+    def save_snapshot(self) -> bool:
+        """Write the current aggregates and cursor to the snapshot file"""
+        with self.lock:
+            snapshot = {
+                'backend': self.backend,
+                'generation': self.generation,
+                'cursor': self.cursor,
+                'total_submissions': self.total_submissions,
+                'score_sum': self.score_sum,
+                'score_distribution': self.score_distribution,
+                'test_submissions': self.test_submissions,
+                'test_scores': self.test_scores,
+                'question_correct': self.question_correct,
+                'saved_at': time.time()
+            }
+            try:
+                atomic_write(self.snapshot_file, lambda f: json.dump(snapshot, f))
+            except Exception as e:
+                logger.error(f"Error saving stats snapshot to {self.snapshot_file}: {e}")
+                return False
+
+            self._dirty = False
+            self._last_snapshot = time.monotonic()
+            return True
+
+    def _changed(self):
+        self._dirty = True
+        if time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL:
+            self.save_snapshot()
+
+    def rebuild(self):
+        """Recompute every aggregate from storage"""
+        with self.lock:
+            self._reset()
+            self._sync_tests()
+            self.catch_up()
+            self.save_snapshot()
+
+    def catch_up(self):
+        """Fold in results stored since the last update"""
+        with self.lock:
+            if self._read_generation() != self.generation:
+                # Scores were re-graded by another process
+                self.rebuild()
+                return
+            if self.storage.tests_signature() != self._tests_signature:
+                self._sync_tests()
+
+            results, cursor = self.storage.results_since(self.cursor)
+            if cursor < self.cursor:
+                # Storage holds fewer results than we've counted; start over
+                self.rebuild()
+                return
+
+            submissions: Dict[str, List] = {}
+            for result in results:
+                self._add_score(result['test_code'], result['score'])
+                submissions.setdefault(result['test_code'], []).append(result['answers'])
+            for test_code, answers in submissions.items():
+                self._add_correct(test_code, answers)
+            self.cursor = cursor
+            if results:
+                self._changed()
+
+    def _add_score(self, test_code: str, score: float, count: int = 1):
+        self.total_submissions += count
+        self.score_sum += score * count
+        self.score_distribution[score_bucket(score)] += count
+        self.test_submissions[test_code] = self.test_submissions.get(test_code, 0) + count
+
+        scores = self.test_scores.get(test_code)
+        if scores is None:
+            scores = self.test_scores[test_code] = {'sum': 0.0, 'high': 0, 'low': 0,
+                                                    'distribution': dict.fromkeys(SCORE_BUCKETS, 0)}
+        scores['sum'] += score * count
+        scores['distribution'][score_bucket(score)] += count
+        if score >= HIGH_SCORE:
+            scores['high'] += count
+        if score < LOW_SCORE:
+            scores['low'] += count
+
+    def _add_correct(self, test_code: str, submissions: List):
+        """Fold new submissions into a test's per-question correct counts"""
+        scorer = self.scorer_for(test_code)
+        if scorer is None:
+            return
+        entry = self.question_correct.get(test_code)
+        if entry is None:
+            if self.test_submissions.get(test_code, 0) != len(submissions):
+                # Earlier results weren't counted; recounted when read
+                return
+            entry = self.question_correct[test_code] = {'answer_key': dict(scorer.answer_key),
+                                                        'counts': [0] * scorer.total_questions}
+        elif entry['answer_key'] != scorer.answer_key:
+            del self.question_correct[test_code]
+            return
+
+        counts = entry['counts']
+        for index, column in enumerate(scorer.correct_matrix(submissions)):
+            counts[index] += column.count(1)
+
+    def count_correct(self, test_code: str, scorer: CompiledScorer, results: List[Dict],
+                      matrix: Optional[List[bytes]] = None):
+        """Recount a test's per-question correct counts from all its results
+
+        Call with no result being stored meanwhile, such as inside the
+        storage's rewrite_test_results(), and after catch_up(). matrix is
+        the results' correct_matrix(), if the caller already has it.
+        """
+        with self.lock:
+            if matrix is None:
+                matrix = scorer.correct_matrix([r['answers'] for r in results])
+            counts = [column.count(1) for column in matrix]
+            self.question_correct[test_code] = {'answer_key': dict(scorer.answer_key), 'counts': counts}
+            self._changed()
+
+    # Update hooks
+    def result_saved(self):
+        """A result was stored"""
+        self.catch_up()
+
+    def scores_changed(self, test_code: str, changes: List[Tuple[float, float]]):
+        """Stored results were re-graded, each from its old score to its new one"""
+        with self.lock:
+            for old_score, new_score in changes:
+                self._add_score(test_code, old_score, -1)
+                self._add_score(test_code, new_score)
+            self._bump_generation()
+            self._changed()
+
+    def test_saved(self, test: Dict):
+        """A test was created or updated"""
+        with self.lock:
+            self.tests[test['code']] = {'title': test.get('title'), 'active': bool(test.get('active', False))}
+
+    def test_deleted(self, code: str):
+        """A test was deleted; its results still count toward the totals"""
+        with self.lock:
+            self.tests.pop(code, None)
+            self.question_correct.pop(code, None)
+
+    # Reads
+    def dashboard(self) -> Dict:
+        """Test and submission counters for the dashboard"""
+        self.catch_up()
+        with self.lock:
+            average = self.score_sum / self.total_submissions if self.total_submissions else 0
+            return {
+                'total_tests': len(self.tests),
+                'active_tests': sum(1 for test in self.tests.values() if test['active']),
+                'total_submissions': self.total_submissions,
+                'average_score': round(average, 1)
+            }
+
+    def test_summary(self, test_code: str) -> Dict:
+        """Submission count, average and score spread for one test"""
+        self.catch_up()
+        with self.lock:
+            count = self.test_submissions.get(test_code, 0)
+            scores = self.test_scores.get(test_code) or {'sum': 0.0, 'high': 0, 'low': 0,
+                                                         'distribution': dict.fromkeys(SCORE_BUCKETS, 0)}
+            return {
+                'total_submissions': count,
+                'average_score': round(scores['sum'] / count, 1) if count else 0.0,
+                'high_scores': scores['high'],
+                'low_scores': scores['low'],
+                'score_distribution': dict(scores['distribution'])
+            }
+
+    def question_counts(self, test_code: str, scorer: CompiledScorer) -> Tuple[int, List[int]]:
+        """Submission count and per-question correct counts under the scorer's answer key"""
+        with self.lock:
+            self.catch_up()
+            entry = self.question_correct.get(test_code)
+            if entry is None or entry['answer_key'] != scorer.answer_key:
+                def recount(results: List[Dict]) -> List[Dict]:
+                    # Under the storage's results write lock, so the results
+                    # recounted are exactly those folded in so far
+                    self.catch_up()
+                    self.count_correct(test_code, scorer, results)
+                    return []
+                self.storage.rewrite_test_results(test_code, recount)
+                entry = self.question_correct[test_code]
+            return self.test_submissions.get(test_code, 0), list(entry['counts'])
+
+    def detailed(self) -> Dict:
+        """Score distribution and per-test submission counts for charts"""
+        self.catch_up()
+        with self.lock:
+            test_counts = {}
+            for test_code, count in self.test_submissions.items():
+                if count <= 0:
+                    continue
+                title = (self.tests.get(test_code) or {}).get('title') or f'Test {test_code}'
+                test_counts[title] = test_counts.get(title, 0) + count
+            return {
+                'score_distribution': dict(self.score_distribution),
+                'test_popularity': test_counts
+            }
@@ -0,0 +1,1053 @@
+"""
+Storage Backends Module
+Persistence for tests, users, results and admins behind DataManager
+"""
+
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Optional, Any, Iterator
+
+from answer_codec import answers_dict, decode_answers, encode_answers
+from metrics import STORAGE_FILE_BYTES, STORAGE_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Superseded journal records tolerated before the results journal is compacted
+COMPACTION_THRESHOLD = 1000
+
+
+class FileLock:
+    """Re-entrant exclusive lock on a data file, shared by threads and processes"""
+
+    _registry: Dict[str, 'FileLock'] = {}
+    _registry_guard = threading.Lock()
+
+    @classmethod
+    def for_path(cls, file_path: str) -> 'FileLock':
+        """Return the process-wide lock for a file path"""
+        path = os.path.abspath(file_path)
+        with cls._registry_guard:
+            lock = cls._registry.get(path)
+            if lock is None:
+                lock = cls._registry[path] = cls(path)
+            return lock
+
+    def __init__(self, file_path: str):
+        self.lock_path = f"{file_path}.lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            # flock conflicts between open file descriptions, so only the
+            # outermost acquisition in this process takes the OS lock
+            try:
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read once at import: os.umask can only be queried by setting it, which isn't thread-safe
+UMASK = _umask()
+
+
+def atomic_write(file_path: str, write) -> None:
+    """Write a file via a synced temp file and os.replace
+
+    Readers see either the old or the new contents, never a truncated file.
+    The file keeps its permissions, or gets the umask default if it's new,
+    rather than mkstemp's owner-only mode.
+    """
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                     prefix=f"{os.path.basename(file_path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def default_admins() -> Dict:
+    """Admin accounts seeded into a fresh data store"""
+    return {
+        "admin": {
+            "id": "admin",
+            "username": "admin",
+            "password_hash": "pbkdf2:sha256:260000$4xI8Q9v0RQKbF0Ky$8f1e2d3c4b5a6e7f8g9h0i1j2k3l4m5n6o7p8q9r0s1t2u3v4w5x6y7z8a9b0c1d2e3f4g5h6i7j8k9l0m1n2o3p4q5r6s7t8u9v0w1x2y3z4a5b6c7d8e9f0g1h2i3j4k5l6m7n8o9p0q1r2s3t4u5v6w7x8y9z0a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6q7r8s9t0u1v2w3x4y5z6",
+            "created_at": datetime.now().isoformat(),
+            "role": "super_admin"
+        }
+    }
+
+
+def merge_draft(stored: Optional[Dict], user_id: int, test_code: str, change: Dict) -> Dict:
+    """Stored draft with a batched change applied; None answers clear a question"""
+    answers = answers_dict(decode_answers(stored['answers'])) if stored else {}
+    for question_num, value in change['answers'].items():
+        if value is None:
+            answers.pop(question_num, None)
+        else:
+            answers[question_num] = value
+    return {
+        'user_id': user_id,
+        'test_code': test_code,
+        'answers': encode_answers(answers),
+        'started_at': min(stored['started_at'], change['started_at']) if stored else change['started_at'],
+        'updated_at': max(stored['updated_at'], change['updated_at']) if stored else change['updated_at']
+    }
+
+
+def draft_from_record(record: Optional[Dict]) -> Optional[Dict]:
+    """Stored draft with its answers decoded"""
+    if record is None:
+        return None
+    return dict(record, answers=answers_dict(decode_answers(record['answers'])))
+
+
+class JSONStorage:
+    """JSON files for tests, users, admins and drafts plus a JSON Lines results journal"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+        # Parsed file contents keyed by path, each stored with the
+        # (mtime_ns, size, inode) signature of the file it was read from
+        self._cache: Dict[str, tuple] = {}
+        # Bumped on every write so callers can cheaply detect changes
+        self.version = 0
+
+        # Results replayed from the journal, refreshed by reading only the
+        # lines appended since the last refresh
+        self._results: List[Dict] = []
+        self._result_positions: Dict[str, int] = {}
+        # (submitted_at, result id) pairs kept sorted as results arrive:
+        # across all results, per user and per test
+        self._time_index: List[tuple] = []
+        self._user_results: Dict[int, List[tuple]] = {}
+        self._test_results: Dict[str, List[tuple]] = {}
+        self._results_offset = 0
+        self._results_inode = None
+        self._superseded_results = 0
+        # Records still holding answers as JSON dicts; compaction repacks them
+        self._legacy_results = 0
+        self._results_lock = threading.RLock()
+
+        # Data file paths
+        self.tests_file = os.path.join(self.data_dir, "tests.json")
+        self.users_file = os.path.join(self.data_dir, "users.json")
+        self.results_file = os.path.join(self.data_dir, "results.json")
+        self.results_log = os.path.join(self.data_dir, "results.jsonl")
+        self.admins_file = os.path.join(self.data_dir, "admins.json")
+        self.drafts_file = os.path.join(self.data_dir, "drafts.json")
+
+        # Initialize data files
+        self.initialize_data_files()
+
+    def initialize_data_files(self):
+        """Initialize JSON data files if they don't exist"""
+        default_data = {
+            self.tests_file: {},
+            self.users_file: {},
+            self.admins_file: default_admins(),
+            self.drafts_file: {}
+        }
+
+        for file_path, default_content in default_data.items():
+            with FileLock.for_path(file_path):
+                if not os.path.exists(file_path):
+                    self.save_json(file_path, default_content)
+
+        with FileLock.for_path(self.results_log):
+            if not os.path.exists(self.results_log):
+                # One-time migration of the legacy results.json list
+                self._write_results_log(self.load_json(self.results_file))
+
+    def _file_signature(self, file_path: str) -> Optional[tuple]:
+        """Return the (mtime_ns, size, inode) signature of a file, or None if missing"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def load_json(self, file_path: str) -> Any:
+        """Load JSON data from file, served from memory while the file is unchanged"""
+        started = time.perf_counter()
+        name = os.path.basename(file_path)
+        signature = self._file_signature(file_path)
+        cached = self._cache.get(file_path)
+        if cached and signature is not None and cached[0] == signature:
+            STORAGE_SECONDS.observe(time.perf_counter() - started, backend='json', operation='load_cached', file=name)
+            return cached[1]
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._cache.pop(file_path, None)
+            return {} if file_path != self.results_file else []
+
+        self._cache[file_path] = (signature, data)
+        STORAGE_SECONDS.observe(time.perf_counter() - started, backend='json', operation='load', file=name)
+        if signature is not None:
+            STORAGE_FILE_BYTES.set(signature[1], file=name)
+        return data
+
+    def save_json(self, file_path: str, data: Any) -> bool:
+        """Atomically save JSON data to file and write it through to the cache"""
+        started = time.perf_counter()
+        try:
+            with FileLock.for_path(file_path):
+                atomic_write(file_path, lambda f: json.dump(data, f, indent=2, ensure_ascii=False))
+                signature = self._file_signature(file_path)
+                self._cache[file_path] = (signature, data)
+        except Exception as e:
+            logger.error(f"Error saving JSON to {file_path}: {e}")
+            # The cached object may already hold the unsaved changes
+            self._cache.pop(file_path, None)
+            return False
+
+        name = os.path.basename(file_path)
+        STORAGE_SECONDS.observe(time.perf_counter() - started, backend='json', operation='save', file=name)
+        if signature is not None:
+            STORAGE_FILE_BYTES.set(signature[1], file=name)
+        self.version += 1
+        return True
+
+    def invalidate_cache(self, file_path: Optional[str] = None):
+        """Drop cached data for one file, or for all files"""
+        if file_path is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(file_path, None)
+        self.version += 1
+
+    # Tests
+    def get_test(self, code: str) -> Optional[Dict]:
+        """Get test by code"""
+        return self.load_json(self.tests_file).get(code)
+
+    def get_all_tests(self) -> List[Dict]:
+        """Get all tests"""
+        return list(self.load_json(self.tests_file).values())
+
+    def get_tests_by_codes(self, codes: List[str]) -> Dict[str, Dict]:
+        """Get several tests in one lookup, keyed by code; unknown codes are omitted"""
+        tests = self.load_json(self.tests_file)
+        return {code: tests[code] for code in codes if code in tests}
+
+    def tests_signature(self) -> Optional[tuple]:
+        """Value that changes whenever any process changes a test"""
+        return self._file_signature(self.tests_file)
+
+    def save_test(self, test: Dict) -> bool:
+        """Insert or replace a test"""
+        with FileLock.for_path(self.tests_file):
+            tests = self.load_json(self.tests_file)
+            tests[test['code']] = test
+            return self.save_json(self.tests_file, tests)
+
+    def delete_test(self, code: str) -> bool:
+        """Delete test, returning False if it doesn't exist"""
+        with FileLock.for_path(self.tests_file):
+            tests = self.load_json(self.tests_file)
+            if code not in tests:
+                return False
+            del tests[code]
+            return self.save_json(self.tests_file, tests)
+
+    # Users
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user by ID"""
+        return self.load_json(self.users_file).get(str(user_id))
+
+    def save_user(self, user: Dict) -> bool:
+        """Insert or replace a user"""
+        with FileLock.for_path(self.users_file):
+            users = self.load_json(self.users_file)
+            users[str(user['id'])] = user
+            return self.save_json(self.users_file, users)
+
+    def count_users(self) -> int:
+        """Number of registered users"""
+        return len(self.load_json(self.users_file))
+
+    def update_users(self, last_seen: Dict[int, str], tests_taken: Dict[int, int]) -> bool:
+        """Apply batched last_seen times and tests_taken increments in one rewrite"""
+        with FileLock.for_path(self.users_file):
+            users = self.load_json(self.users_file)
+            changed = False
+            for user_id, seen in last_seen.items():
+                user = users.get(str(user_id))
+                # Another process may have flushed a later visit already
+                if user is not None and seen > user.get('last_seen', ''):
+                    user['last_seen'] = seen
+                    changed = True
+            for user_id, count in tests_taken.items():
+                user = users.get(str(user_id))
+                if user is not None:
+                    user['tests_taken'] = user.get('tests_taken', 0) + count
+                    changed = True
+            return self.save_json(self.users_file, users) if changed else True
+
+    def bump_tests_taken(self, counts: Dict[int, int]) -> bool:
+        """Add to several users' tests_taken counters in one rewrite"""
+        return self.update_users({}, counts)
+
+    # Drafts
+    def get_draft(self, user_id: int, test_code: str) -> Optional[Dict]:
+        """Get a user's saved in-progress attempt at a test"""
+        return draft_from_record(self.load_json(self.drafts_file).get(f"{user_id}:{test_code}"))
+
+    def update_drafts(self, changes: Dict[tuple, Dict], deleted: List[tuple], expire_before: str) -> bool:
+        """Drop deleted and expired drafts and merge batched changes, in one rewrite"""
+        with FileLock.for_path(self.drafts_file):
+            drafts = self.load_json(self.drafts_file)
+            for user_id, test_code in deleted:
+                drafts.pop(f"{user_id}:{test_code}", None)
+            for (user_id, test_code), change in changes.items():
+                key = f"{user_id}:{test_code}"
+                drafts[key] = merge_draft(drafts.get(key), user_id, test_code, change)
+            for key in [key for key, draft in drafts.items() if draft['updated_at'] < expire_before]:
+                del drafts[key]
+            return self.save_json(self.drafts_file, drafts)
+
+    # Results Journal
+    @staticmethod
+    def _journal_line(result: Dict) -> str:
+        """One journal record with its answers packed into a single row string"""
+        record = dict(result, answers=encode_answers(result.get('answers')))
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    def _write_results_log(self, results: List[Dict]) -> bool:
+        """Rewrite the results journal with the given records"""
+        def write(f):
+            for result in results:
+                f.write(self._journal_line(result))
+
+        try:
+            with FileLock.for_path(self.results_log):
+                atomic_write(self.results_log, write)
+        except Exception as e:
+            logger.error(f"Error writing results journal {self.results_log}: {e}")
+            return False
+
+        self.version += 1
+        return True
+
+    def _append_results(self, results: List[Dict]) -> bool:
+        """Append records to the results journal in a single write"""
+        started = time.perf_counter()
+        lines = ''.join(map(self._journal_line, results))
+        try:
+            with FileLock.for_path(self.results_log):
+                with open(self.results_log, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = os.fstat(f.fileno()).st_size
+        except Exception as e:
+            logger.error(f"Error appending to results journal {self.results_log}: {e}")
+            return False
+
+        name = os.path.basename(self.results_log)
+        STORAGE_SECONDS.observe(time.perf_counter() - started, backend='json', operation='append', file=name)
+        STORAGE_FILE_BYTES.set(size, file=name)
+        self.version += 1
+        return True
+
+    def _read_journal(self, offset: int = 0):
+        """Stream (record, end offset) pairs from the results journal"""
+        try:
+            with open(self.results_log, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Partially written record; pick it up next time
+                        break
+                    offset += len(line)
+                    if line.strip():
+                        yield json.loads(line), offset
+        except FileNotFoundError:
+            return
+
+    def _load_results(self) -> List[Dict]:
+        """Return all results, replaying any journal lines not yet seen"""
+        with self._results_lock:
+            return self._refresh_results()
+
+    def _refresh_results(self) -> List[Dict]:
+        try:
+            stat = os.stat(self.results_log)
+        except OSError:
+            return self._results
+
+        if stat.st_ino != self._results_inode or stat.st_size < self._results_offset:
+            # Journal was compacted or replaced; replay it from scratch
+            self._results = []
+            self._result_positions = {}
+            self._time_index = []
+            self._user_results = {}
+            self._test_results = {}
+            self._results_offset = 0
+            self._results_inode = stat.st_ino
+            self._superseded_results = 0
+            self._legacy_results = 0
+
+        if stat.st_size > self._results_offset:
+            started = time.perf_counter()
+            for result, offset in self._read_journal(self._results_offset):
+                if not isinstance(result.get('answers'), str):
+                    self._legacy_results += 1
+                result['answers'] = decode_answers(result.get('answers'))
+                position = self._result_positions.get(result['id'])
+                if position is None:
+                    self._result_positions[result['id']] = len(self._results)
+                    self._results.append(result)
+                else:
+                    # A later record for the same id replaces the earlier one
+                    self._unindex_result(self._results[position])
+                    self._results[position] = result
+                    self._superseded_results += 1
+                self._index_result(result)
+                self._results_offset = offset
+            STORAGE_SECONDS.observe(time.perf_counter() - started, backend='json', operation='replay',
+                                    file=os.path.basename(self.results_log))
+
+        return self._results
+
+    def _result_indexes(self, result: Dict) -> List[List[tuple]]:
+        return [self._time_index,
+                self._user_results.setdefault(result['user_id'], []),
+                self._test_results.setdefault(result['test_code'], [])]
+
+    def _index_result(self, result: Dict):
+        entry = (result['submitted_at'], result['id'])
+        for entries in self._result_indexes(result):
+            bisect.insort(entries, entry)
+
+    def _unindex_result(self, result: Dict):
+        entry = (result['submitted_at'], result['id'])
+        for entries in self._result_indexes(result):
+            index = bisect.bisect_left(entries, entry)
+            if index < len(entries) and entries[index] == entry:
+                del entries[index]
+
+    def compact_results(self) -> bool:
+        """Rewrite the journal keeping only the latest record for each result"""
+        with FileLock.for_path(self.results_log):
+            results = list(self._load_results())
+            if not self._write_results_log(results):
+                return False
+            self._results_inode = None
+            self._load_results()
+        return True
+
+    # Results
+    def add_result(self, result: Dict) -> bool:
+        """Append a result record"""
+        return self.add_results([result])
+
+    def add_results(self, results: List[Dict]) -> bool:
+        """Append several result records"""
+        if not self._append_results(results):
+            return False
+        self._load_results()
+        if self._superseded_results > COMPACTION_THRESHOLD or self._legacy_results > COMPACTION_THRESHOLD:
+            self.compact_results()
+        return True
+
+    def rewrite_test_results(self, test_code: str, rewrite) -> bool:
+        """Store the records rewrite() returns for a test's results, with no result added meanwhile
+
+        The journal lock is held from the read to the append, so rewrite()
+        sees every result of the test and appends from other threads and
+        processes wait for it.
+        """
+        with FileLock.for_path(self.results_log):
+            records = rewrite(self.get_results_by_test(test_code))
+            return self.add_results(records) if records else True
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Iterate over all results in insertion order"""
+        return iter(self._load_results())
+
+    def get_result(self, result_id: str) -> Optional[Dict]:
+        """Get a result by id"""
+        with self._results_lock:
+            results = self._load_results()
+            position = self._result_positions.get(result_id)
+            return results[position] if position is not None else None
+
+    def count_results(self) -> int:
+        """Number of stored results"""
+        return len(self._load_results())
+
+    def results_since(self, cursor: int) -> tuple:
+        """Results stored after a cursor, with the cursor to resume from
+
+        The cursor is a position in the journal's replay order, which
+        compaction and superseding records leave unchanged.
+        """
+        with self._results_lock:
+            results = self._load_results()
+            return results[cursor:], len(results)
+
+    def get_user_results(self, user_id: int, limit: int = None) -> List[Dict]:
+        """Get results for a user, newest first"""
+        with self._results_lock:
+            results = self._load_results()
+            entries = self._user_results.get(user_id, [])
+            if limit:
+                entries = entries[-limit:]
+            return [results[self._result_positions[result_id]] for _, result_id in reversed(entries)]
+
+    def count_user_results(self, user_id: int) -> int:
+        """Number of results a user has submitted"""
+        with self._results_lock:
+            self._load_results()
+            return len(self._user_results.get(user_id, ()))
+
+    def query_results(self, test_code: Optional[str] = None, user_id: Optional[int] = None,
+                      user_name: Optional[str] = None, min_score: Optional[float] = None,
+                      max_score: Optional[float] = None, date_from: Optional[str] = None,
+                      date_to: Optional[str] = None, after: Optional[tuple] = None,
+                      descending: bool = True, limit: int = 50) -> List[Dict]:
+        """One page of results ordered by (submitted_at, id), resuming after a keyset cursor
+
+        Scores match min_score <= score < max_score and dates
+        date_from <= submitted_at < date_to.
+        """
+        user_ids = None
+        if user_name:
+            needle = user_name.casefold()
+            user_ids = {int(uid) for uid, user in self.load_json(self.users_file).items()
+                        if needle in (user.get('name') or '').casefold()}
+
+        with self._results_lock:
+            results = self._load_results()
+            # Walk the narrowest index that covers the filters
+            if user_id is not None:
+                entries = self._user_results.get(user_id, [])
+            elif test_code is not None:
+                entries = self._test_results.get(test_code, [])
+            else:
+                entries = self._time_index
+
+            lo = bisect.bisect_left(entries, (date_from,)) if date_from else 0
+            hi = bisect.bisect_left(entries, (date_to,)) if date_to else len(entries)
+            if after is not None:
+                if descending:
+                    hi = min(hi, bisect.bisect_left(entries, tuple(after)))
+                else:
+                    lo = max(lo, bisect.bisect_right(entries, tuple(after)))
+
+            page = []
+            for index in (range(hi - 1, lo - 1, -1) if descending else range(lo, hi)):
+                result = results[self._result_positions[entries[index][1]]]
+                if test_code is not None and result['test_code'] != test_code:
+                    continue
+                if user_ids is not None and result['user_id'] not in user_ids:
+                    continue
+                if min_score is not None and result['score'] < min_score:
+                    continue
+                if max_score is not None and result['score'] >= max_score:
+                    continue
+                page.append(result)
+                if len(page) >= limit:
+                    break
+            return page
+
+    def get_results_by_test(self, test_code: str) -> List[Dict]:
+        """Get all results for a test in submission order"""
+        with self._results_lock:
+            self._load_results()
+            return self._results_at(self._test_results.get(test_code, ()))
+
+    def iter_results_by_test(self, test_code: str, since: Optional[str] = None,
+                             limit: Optional[int] = None) -> Iterator[Dict]:
+        """Stream a test's results in submission order, optionally after a timestamp
+
+        Walks the test's (submitted_at, id) index from the first entry after
+        since, the order SQLite's (test_code, submitted_at, id) index gives.
+        """
+        if limit is not None and limit < 0:
+            raise ValueError(f"limit must not be negative: {limit}")
+        with self._results_lock:
+            self._load_results()
+            entries = self._test_results.get(test_code, [])
+            start = bisect.bisect_right(entries, since, key=itemgetter(0)) if since else 0
+            end = len(entries) if limit is None else start + limit
+            # Resolved up front; results submitted while streaming belong to the next pull
+            page = self._results_at(entries[start:end])
+        yield from page
+
+    def _results_at(self, entries) -> List[Dict]:
+        """Records for (submitted_at, id) index entries; call with the results lock held"""
+        results = self._load_results()
+        positions = self._result_positions
+        return [results[positions[result_id]] for _, result_id in entries]
+
+    def get_all_results(self) -> List[Dict]:
+        """Get all results, newest first"""
+        with self._results_lock:
+            self._load_results()
+            return self._results_at(reversed(self._time_index))
+
+    def get_recent_results(self, limit: int = 10) -> List[Dict]:
+        """Get the most recently submitted results"""
+        with self._results_lock:
+            self._load_results()
+            return self._results_at(reversed(self._time_index[-limit:])) if limit > 0 else []
+
+    # Admins
+    def get_admin(self, username: str) -> Optional[Dict]:
+        """Get admin by username"""
+        return self.load_json(self.admins_file).get(username)
+
+    def get_all_admins(self) -> List[Dict]:
+        """Get all admins"""
+        return list(self.load_json(self.admins_file).values())
+
+
+class SQLiteStorage:
+    """Single SQLite database in WAL mode with indexed results"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tests (
+            code TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            test_code TEXT NOT NULL,
+            score REAL NOT NULL,
+            submitted_at TEXT NOT NULL,
+            answers TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS admins (
+            username TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS drafts (
+            user_id INTEGER NOT NULL,
+            test_code TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, test_code)
+        );
+        CREATE INDEX IF NOT EXISTS idx_drafts_updated ON drafts(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_results_test ON results(test_code);
+        -- Keyset pagination orders by (submitted_at, id); these replace the
+        -- earlier indexes on submitted_at alone
+        DROP INDEX IF EXISTS idx_results_user;
+        DROP INDEX IF EXISTS idx_results_submitted;
+        DROP INDEX IF EXISTS idx_results_test_submitted;
+        CREATE INDEX IF NOT EXISTS idx_results_user_page ON results(user_id, submitted_at, id);
+        CREATE INDEX IF NOT EXISTS idx_results_page ON results(submitted_at, id);
+        CREATE INDEX IF NOT EXISTS idx_results_test_page ON results(test_code, submitted_at, id);
+        -- Change counters other processes poll instead of rereading a table
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS tests_inserted AFTER INSERT ON tests BEGIN
+            INSERT INTO counters (name, value) VALUES ('tests', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tests_updated AFTER UPDATE ON tests BEGIN
+            INSERT INTO counters (name, value) VALUES ('tests', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tests_deleted AFTER DELETE ON tests BEGIN
+            INSERT INTO counters (name, value) VALUES ('tests', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END;
+    """
+
+    RESULT_COLUMNS = "id, user_id, test_code, answers, score, submitted_at"
+
+    def __init__(self, data_dir: str, db_name: str = "webbot.db"):
+        self.data_dir = data_dir
+        self.db_file = os.path.join(self.data_dir, db_name)
+        self.version = 0
+
+        # sqlite3 connections can't be shared across threads
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(self.SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM admins").fetchone()[0] == 0:
+            for username, admin in default_admins().items():
+                self._put(conn, 'admins', 'username', username, admin)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # SQLite's lower() only folds ASCII; match names the way Python does
+            conn.create_function("casefold", 1, lambda value: value.casefold() if isinstance(value, str) else value,
+                                 deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def _put(self, conn: sqlite3.Connection, table: str, key_column: str, key: Any, data: Dict):
+        conn.execute(f"INSERT OR REPLACE INTO {table} ({key_column}, data) VALUES (?, ?)",
+                     (key, json.dumps(data, ensure_ascii=False)))
+
+    def _get(self, table: str, key_column: str, key: Any) -> Optional[Dict]:
+        row = self._connect().execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        """Run a write statement in its own transaction, returning the row count"""
+        conn = self._connect()
+        with STORAGE_SECONDS.time(backend='sqlite', operation='write', file=os.path.basename(self.db_file)):
+            with conn:
+                cursor = conn.execute(sql, params)
+        self.version += 1
+        return cursor.rowcount
+
+    @staticmethod
+    def _result_from_row(row: tuple) -> Dict:
+        return {
+            'id': row[0],
+            'user_id': row[1],
+            'test_code': row[2],
+            'answers': decode_answers(row[3]),
+            'score': row[4],
+            'submitted_at': row[5]
+        }
+
+    def _query_results(self, where: str = "", params: tuple = ()) -> List[Dict]:
+        rows = self._connect().execute(f"SELECT {self.RESULT_COLUMNS} FROM results {where}", params)
+        return [self._result_from_row(row) for row in rows]
+
+    # Tests
+    def get_test(self, code: str) -> Optional[Dict]:
+        """Get test by code"""
+        return self._get('tests', 'code', code)
+
+    def get_all_tests(self) -> List[Dict]:
+        """Get all tests"""
+        rows = self._connect().execute("SELECT data FROM tests ORDER BY rowid")
+        return [json.loads(row[0]) for row in rows]
+
+    def get_tests_by_codes(self, codes: List[str]) -> Dict[str, Dict]:
+        """Get several tests in one query, keyed by code; unknown codes are omitted"""
+        codes = list(dict.fromkeys(codes))
+        if not codes:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT code, data FROM tests WHERE code IN ({', '.join('?' * len(codes))})", codes
+        )
+        return {code: json.loads(data) for code, data in rows}
+
+    def tests_signature(self) -> int:
+        """Value that changes whenever any process changes a test"""
+        row = self._connect().execute("SELECT value FROM counters WHERE name = 'tests'").fetchone()
+        return row[0] if row else 0
+
+    def save_test(self, test: Dict) -> bool:
+        """Insert or replace a test"""
+        self._write("INSERT OR REPLACE INTO tests (code, data) VALUES (?, ?)",
+                    (test['code'], json.dumps(test, ensure_ascii=False)))
+        return True
+
+    def delete_test(self, code: str) -> bool:
+        """Delete test, returning False if it doesn't exist"""
+        return self._write("DELETE FROM tests WHERE code = ?", (code,)) > 0
+
+    # Users
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user by ID"""
+        return self._get('users', 'id', int(user_id))
+
+    def save_user(self, user: Dict) -> bool:
+        """Insert or replace a user"""
+        self._write("INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+                    (int(user['id']), json.dumps(user, ensure_ascii=False)))
+        return True
+
+    def count_users(self) -> int:
+        """Number of registered users"""
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def update_users(self, last_seen: Dict[int, str], tests_taken: Dict[int, int]) -> bool:
+        """Apply batched last_seen times and tests_taken increments in one transaction"""
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading, or a concurrent flush could lose increments
+            conn.execute("BEGIN IMMEDIATE")
+            for user_id in set(last_seen) | set(tests_taken):
+                row = conn.execute("SELECT data FROM users WHERE id = ?", (int(user_id),)).fetchone()
+                if row:
+                    user = json.loads(row[0])
+                    # Another process may have flushed a later visit already
+                    if user_id in last_seen and last_seen[user_id] > user.get('last_seen', ''):
+                        user['last_seen'] = last_seen[user_id]
+                    user['tests_taken'] = user.get('tests_taken', 0) + tests_taken.get(user_id, 0)
+                    self._put(conn, 'users', 'id', int(user_id), user)
+        self.version += 1
+        return True
+
+    def bump_tests_taken(self, counts: Dict[int, int]) -> bool:
+        """Add to several users' tests_taken counters in one transaction"""
+        return self.update_users({}, counts)
+
+    # Drafts
+    DRAFT_COLUMNS = "user_id, test_code, answers, started_at, updated_at"
+
+    def _draft_row(self, conn: sqlite3.Connection, user_id: int, test_code: str) -> Optional[Dict]:
+        row = conn.execute(f"SELECT {self.DRAFT_COLUMNS} FROM drafts WHERE user_id = ? AND test_code = ?",
+                           (int(user_id), test_code)).fetchone()
+        return dict(zip(('user_id', 'test_code', 'answers', 'started_at', 'updated_at'), row)) if row else None
+
+    def get_draft(self, user_id: int, test_code: str) -> Optional[Dict]:
+        """Get a user's saved in-progress attempt at a test"""
+        return draft_from_record(self._draft_row(self._connect(), user_id, test_code))
+
+    def update_drafts(self, changes: Dict[tuple, Dict], deleted: List[tuple], expire_before: str) -> bool:
+        """Drop deleted and expired drafts and merge batched changes, in one transaction"""
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading, or a concurrent flush could lose changes
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM drafts WHERE user_id = ? AND test_code = ?",
+                             [(int(user_id), test_code) for user_id, test_code in deleted])
+            for (user_id, test_code), change in changes.items():
+                draft = merge_draft(self._draft_row(conn, user_id, test_code), int(user_id), test_code, change)
+                conn.execute(f"INSERT OR REPLACE INTO drafts ({self.DRAFT_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                             (draft['user_id'], draft['test_code'], draft['answers'],
+                              draft['started_at'], draft['updated_at']))
+            conn.execute("DELETE FROM drafts WHERE updated_at < ?", (expire_before,))
+        return True
+
+    # Results
+    def add_result(self, result: Dict) -> bool:
+        """Insert a result record, replacing any earlier record with the same id"""
+        return self.add_results([result])
+
+    def _upsert_results(self, conn: sqlite3.Connection, results: List[Dict]):
+        # Upsert rather than REPLACE so a rewritten record keeps its rowid
+        conn.executemany(
+            f"INSERT INTO results ({self.RESULT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, test_code = excluded.test_code, "
+            "answers = excluded.answers, score = excluded.score, submitted_at = excluded.submitted_at",
+            [(r['id'], r['user_id'], r['test_code'], encode_answers(r['answers']),
+              r['score'], r['submitted_at']) for r in results]
+        )
+
+    def add_results(self, results: List[Dict]) -> bool:
+        """Insert several result records in one transaction"""
+        conn = self._connect()
+        with STORAGE_SECONDS.time(backend='sqlite', operation='insert_results', file=os.path.basename(self.db_file)):
+            with conn:
+                self._upsert_results(conn, results)
+        self.version += 1
+        return True
+
+    def rewrite_test_results(self, test_code: str, rewrite) -> bool:
+        """Store the records rewrite() returns for a test's results, with no result added meanwhile"""
+        conn = self._connect()
+        with conn:
+            # Take the write lock before reading, so results stored meanwhile wait for the rewrite
+            conn.execute("BEGIN IMMEDIATE")
+            records = rewrite(self.get_results_by_test(test_code))
+            if records:
+                self._upsert_results(conn, records)
+        if records:
+            self.version += 1
+        return True
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Iterate over all results in insertion order"""
+        rows = self._connect().execute(f"SELECT {self.RESULT_COLUMNS} FROM results ORDER BY rowid")
+        for row in rows:
+            yield self._result_from_row(row)
+
+    def get_result(self, result_id: str) -> Optional[Dict]:
+        """Get a result by id"""
+        results = self._query_results("WHERE id = ?", (result_id,))
+        return results[0] if results else None
+
+    def count_results(self) -> int:
+        """Number of stored results"""
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def results_since(self, cursor: int) -> tuple:
+        """Results stored after a cursor (a rowid), with the cursor to resume from"""
+        rows = self._connect().execute(
+            f"SELECT rowid, {self.RESULT_COLUMNS} FROM results WHERE rowid > ? ORDER BY rowid", (cursor,)
+        ).fetchall()
+        if not rows:
+            # MAX(rowid) is a single b-tree lookup; a value below the cursor
+            # tells the caller the table was rebuilt
+            return [], self._connect().execute("SELECT MAX(rowid) FROM results").fetchone()[0] or 0
+        return [self._result_from_row(row[1:]) for row in rows], rows[-1][0]
+
+    def get_user_results(self, user_id: int, limit: int = None) -> List[Dict]:
+        """Get results for a user, newest first"""
+        return self._query_results("WHERE user_id = ? ORDER BY submitted_at DESC LIMIT ?",
+                                   (user_id, limit or -1))
+
+    def count_user_results(self, user_id: int) -> int:
+        """Number of results a user has submitted"""
+        return self._connect().execute("SELECT COUNT(*) FROM results WHERE user_id = ?",
+                                       (user_id,)).fetchone()[0]
+
+    def query_results(self, test_code: Optional[str] = None, user_id: Optional[int] = None,
+                      user_name: Optional[str] = None, min_score: Optional[float] = None,
+                      max_score: Optional[float] = None, date_from: Optional[str] = None,
+                      date_to: Optional[str] = None, after: Optional[tuple] = None,
+                      descending: bool = True, limit: int = 50) -> List[Dict]:
+        """One page of results ordered by (submitted_at, id), resuming after a keyset cursor
+
+        Scores match min_score <= score < max_score and dates
+        date_from <= submitted_at < date_to.
+        """
+        clauses, params = [], []
+        if test_code is not None:
+            clauses.append("test_code = ?")
+            params.append(test_code)
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if user_name:
+            clauses.append("user_id IN (SELECT id FROM users WHERE instr(casefold(json_extract(data, '$.name')), ?))")
+            params.append(user_name.casefold())
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("score < ?")
+            params.append(max_score)
+        if date_from:
+            clauses.append("submitted_at >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("submitted_at < ?")
+            params.append(date_to)
+        if after is not None:
+            clauses.append(f"(submitted_at, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        return self._query_results(f"{where}ORDER BY submitted_at {direction}, id {direction} LIMIT ?",
+                                   tuple(params) + (limit,))
+
+    def get_results_by_test(self, test_code: str) -> List[Dict]:
+        """Get all results for a test in submission order"""
+        return self._query_results("WHERE test_code = ? ORDER BY submitted_at, id", (test_code,))
+
+    def iter_results_by_test(self, test_code: str, since: Optional[str] = None,
+                             limit: Optional[int] = None) -> Iterator[Dict]:
+        """Stream a test's results in submission order, optionally after a timestamp"""
+        if limit is not None and limit < 0:
+            # SQLite reads a negative LIMIT as no limit at all
+            raise ValueError(f"limit must not be negative: {limit}")
+        rows = self._connect().execute(
+            f"SELECT {self.RESULT_COLUMNS} FROM results WHERE test_code = ? AND submitted_at > ? "
+            "ORDER BY submitted_at, id LIMIT ?",
+            (test_code, since or '', -1 if limit is None else limit)
+        )
+        for row in rows:
+            yield self._result_from_row(row)
+
+    def get_all_results(self) -> List[Dict]:
+        """Get all results, newest first"""
+        return self._query_results("ORDER BY submitted_at DESC, id DESC")
+
+    def get_recent_results(self, limit: int = 10) -> List[Dict]:
+        """Get the most recently submitted results"""
+        return self._query_results("ORDER BY submitted_at DESC, id DESC LIMIT ?", (limit,))
+
+    # Admins
+    def get_admin(self, username: str) -> Optional[Dict]:
+        """Get admin by username"""
+        return self._get('admins', 'username', username)
+
+    def get_all_admins(self) -> List[Dict]:
+        """Get all admins"""
+        rows = self._connect().execute("SELECT data FROM admins ORDER BY rowid")
+        return [json.loads(row[0]) for row in rows]
+
+    def save_admin(self, admin: Dict) -> bool:
+        """Insert or replace an admin"""
+        conn = self._connect()
+        with conn:
+            self._put(conn, 'admins', 'username', admin['username'], admin)
+        self.version += 1
+        return True
+
+
+STORAGE_BACKENDS = {
+    'json': JSONStorage,
+    'sqlite': SQLiteStorage,
+}
+
+
+def create_storage(backend: str, data_dir: str):
+    """Create the storage backend registered under the given name"""
+    try:
+        storage_class = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {backend!r}") from None
+    return storage_class(data_dir)
@@ -0,0 +1,136 @@
+"""
+User Registry Module
+Registers users durably and batches last_seen and tests_taken updates into periodic writes
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of pending user updates
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+
+
+class UserRegistry:
+    """Front for user records that coalesces frequent small updates
+
+    New users are written at once. Visits and test counts only mark the
+    user dirty: the latest last_seen and the summed tests_taken increments
+    are held in memory and stored by a background thread in one write per
+    interval, however many updates arrived. Reads merge pending updates in,
+    so this process always sees its own changes; other processes see them
+    after the next flush. Increments and later-wins timestamps merge safely
+    with flushes from other processes.
+    """
+
+    def __init__(self, storage, flush_interval: float = USER_FLUSH_INTERVAL):
+        self.storage = storage
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._last_seen: Dict[int, str] = {}
+        self._tests_taken: Dict[int, int] = {}
+
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """A user with any pending updates applied"""
+        user = self.storage.get_user(user_id)
+        if user is None:
+            return None
+        with self._lock:
+            last_seen = self._last_seen.get(user_id)
+            tests_taken = self._tests_taken.get(user_id, 0)
+        if last_seen is None and not tests_taken:
+            return user
+
+        user = dict(user)
+        if last_seen is not None and last_seen > user.get('last_seen', ''):
+            user['last_seen'] = last_seen
+        user['tests_taken'] = user.get('tests_taken', 0) + tests_taken
+        return user
+
+    def get_or_create(self, user_id: int, username: str) -> Dict:
+        """Get a user and record the visit, registering them first if they're new"""
+        now = datetime.now().isoformat()
+        if self.storage.get_user(user_id) is None:
+            user = {
+                'id': user_id,
+                'name': username,
+                'username': username,
+                'created_at': now,
+                'last_seen': now,
+                'tests_taken': 0
+            }
+            # Registration is written through so a new user is never lost
+            self.storage.save_user(user)
+            return dict(user)
+
+        with self._lock:
+            self._last_seen[user_id] = now
+        self._ensure_flusher()
+        return self.get(user_id)
+
+    def record_tests(self, counts: Dict[int, int]):
+        """Queue tests_taken increments per user id"""
+        with self._lock:
+            for user_id, count in counts.items():
+                self._tests_taken[user_id] = self._tests_taken.get(user_id, 0) + count
+        self._ensure_flusher()
+
+    @property
+    def pending_count(self) -> int:
+        """Users with updates not yet stored"""
+        with self._lock:
+            return len(set(self._last_seen) | set(self._tests_taken))
+
+    def flush(self) -> bool:
+        """Store all pending updates in one write"""
+        with self._lock:
+            last_seen, self._last_seen = self._last_seen, {}
+            tests_taken, self._tests_taken = self._tests_taken, {}
+        if not last_seen and not tests_taken:
+            return True
+
+        try:
+            stored = self.storage.update_users(last_seen, tests_taken)
+        except Exception as e:
+            logger.error(f"Error storing updates for {len(last_seen | tests_taken)} users: {e}")
+            stored = False
+        if not stored:
+            # Put them back for the next attempt, merged with anything newer
+            with self._lock:
+                for user_id, seen in last_seen.items():
+                    if seen > self._last_seen.get(user_id, ''):
+                        self._last_seen[user_id] = seen
+                for user_id, count in tests_taken.items():
+                    self._tests_taken[user_id] = self._tests_taken.get(user_id, 0) + count
+        return stored
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop the background flusher and store what's pending"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_flusher(self):
+        # Started on first use, so read-only tools never spawn it
+        if self._thread is None and not self._stopping:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="user-registry-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            if not self._stopping:
+                self.flush()
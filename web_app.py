@@ -3,21 +3,46 @@ Flask Web Application
 Handles admin panel and student web app
 """
 
+import atexit
+import math
 import os
 import json
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from werkzeug.security import check_password_hash
+from typing import Dict, Optional
+from flask import Flask, Response, make_response, render_template, request, jsonify, session, redirect, url_for, flash
+from assets import Asset, StaticAssets, conditional_response, content_etag
 from data_manager import DataManager
-from auth import require_admin, login_required
+from drafts import DraftStore
+from export import EXPORT_FORMATS, export_results
+from ingestion import QueueFull, SubmissionQueue
+import metrics
+from auth import LoginBusy, LoginRateLimited, LoginService, require_admin, require_metrics_access, login_required
 
 
-def create_app():
-    """Create and configure Flask application"""
+# Largest page /admin/api/results will return
+RESULTS_PAGE_MAX = 200
+
+
+def create_app(data_manager: Optional[DataManager] = None):
+    """Create and configure Flask application, on the given DataManager or a new one"""
     app = Flask(__name__)
     app.secret_key = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 
-    data_manager = DataManager()
+    static_assets = StaticAssets(app)
+    request_profiler = metrics.init_app(app)
+
+    data_manager = data_manager or DataManager()
+    submission_queue = SubmissionQueue(data_manager)
+    atexit.register(submission_queue.stop)
+    app.extensions['submission_queue'] = submission_queue
+    draft_store = DraftStore(data_manager.storage)
+    atexit.register(draft_store.stop)
+    app.extensions['draft_store'] = draft_store
+    login_service = LoginService(data_manager)
+    app.extensions['login_service'] = login_service
+
+    # Precompressed public test payloads keyed by test code
+    public_test_assets: Dict[str, Asset] = {}
 
     # Root route - redirect to admin login
     @app.route('/')
@@ -40,16 +65,32 @@ def create_app():
         if not user_data:
             return "Error: User not found", 404
 
-        # If test code provided, validate it
+        # If test code provided, validate it; the page only ever sees the public view
         test_data = None
         if test_code:
-            test_data = data_manager.get_test_by_code(test_code)
-            if not test_data or not test_data.get('active'):
+            test_data = data_manager.get_public_test(test_code)
+            if not test_data:
                 return "Error: Invalid or inactive test code", 400
 
-        return render_template('student_webapp.html',
-                               user_data=user_data,
-                               test_data=test_data)
+        # Unchanged user, test and assets: the client's copy is still current
+        etag = content_etag(user_data, test_data, static_assets.version)
+        return conditional_response(etag, lambda: render_template('student_webapp.html',
+                                                                  user_data=user_data,
+                                                                  test_data=test_data))
+
+    @app.route('/api/test/<test_code>')
+    def public_test(test_code):
+        """Test details and question layout for students, without the answer key"""
+        payload = data_manager.get_public_test_payload(test_code)
+        if payload is None:
+            return jsonify({'error': 'Invalid or inactive test code'}), 404
+
+        # The payload object only changes when the test is edited
+        asset = public_test_assets.get(test_code)
+        if asset is None or asset.body is not payload:
+            asset = Asset(payload, 'application/json')
+            public_test_assets[test_code] = asset
+        return asset.respond("no-cache")
 
     @app.route('/api/submit_test', methods=['POST'])
     def submit_test():
@@ -61,25 +102,81 @@ def create_app():
             answers = data['answers']
 
             # Validate test
-            test = data_manager.get_test_by_code(test_code)
+            with metrics.SUBMIT_STAGE_SECONDS.time(stage='validate'):
+                test = data_manager.get_test_by_code(test_code)
             if not test or not test.get('active'):
                 return jsonify({'error': 'Invalid test code'}), 400
 
             # Calculate score
-            score = data_manager.calculate_score(test, answers)
-
-            # Save result
-            result_id = data_manager.save_test_result(user_id, test_code, answers, score)
+            with metrics.SUBMIT_STAGE_SECONDS.time(stage='score'):
+                score = data_manager.calculate_score(test, answers)
+
+            # Queue result; the background writer stores it in the next batch
+            result = data_manager.build_result(user_id, test_code, answers, score)
+            try:
+                with metrics.SUBMIT_STAGE_SECONDS.time(stage='enqueue'):
+                    result_id = submission_queue.submit(result)
+            except QueueFull:
+                response = jsonify({'error': 'Server busy, please retry'})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+
+            # The attempt is over; its autosaved draft is no longer needed
+            draft_store.discard(user_id, test_code)
 
             return jsonify({
                 'success': True,
                 'score': score,
-                'result_id': result_id
+                'result_id': result_id,
+                'status': 'pending'
             })
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/draft/<test_code>', methods=['POST'])
+    def save_draft(test_code):
+        """Autosave changed answers of an in-progress attempt"""
+        data = request.get_json(silent=True) or {}
+        try:
+            user_id = int(data['user_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'user_id required'}), 400
+        if not data_manager.get_public_test(test_code):
+            return jsonify({'error': 'Invalid or inactive test code'}), 404
+
+        try:
+            updated_at = draft_store.patch(user_id, test_code, data.get('answers') or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'success': True, 'updated_at': updated_at})
+
+    @app.route('/api/draft/<test_code>')
+    def resume_draft(test_code):
+        """Saved answers and elapsed time of an in-progress attempt"""
+        try:
+            user_id = int(request.args['user_id'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'user_id required'}), 400
+
+        draft = draft_store.get(user_id, test_code)
+        if draft is None:
+            return jsonify({'error': 'No saved attempt'}), 404
+        # Measured on the server, so reloading the page doesn't restart the timer
+        elapsed = datetime.now() - datetime.fromisoformat(draft['started_at'])
+        return jsonify({
+            'answers': draft['answers'],
+            'started_at': draft['started_at'],
+            'updated_at': draft['updated_at'],
+            'elapsed_seconds': int(elapsed.total_seconds())
+        })
+
+    @app.route('/api/submission/<result_id>')
+    def submission_status(result_id):
+        """Check whether a submitted result has been stored yet"""
+        status = submission_queue.status(result_id)
+        return jsonify(status), 404 if status['status'] == 'unknown' else 200
+
     # Admin Routes
     @app.route('/admin')
     def admin_login():
@@ -94,8 +191,20 @@ def create_app():
         username = request.form['username']
         password = request.form['password']
 
-        admin = data_manager.get_admin(username)
-        if admin and check_password_hash(admin['password_hash'], password):
+        try:
+            admin = login_service.authenticate(username, password, request.remote_addr or 'unknown')
+        except LoginRateLimited as e:
+            flash('Too many login attempts. Please wait and try again.', 'error')
+            response = make_response(render_template('admin_login.html'), 429)
+            response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+        except LoginBusy:
+            flash('The server is busy. Please try again shortly.', 'error')
+            response = make_response(render_template('admin_login.html'), 503)
+            response.headers['Retry-After'] = '1'
+            return response
+
+        if admin:
             session['admin_id'] = admin['id']
             session['admin_username'] = admin['username']
             flash('Login successful!', 'success')
@@ -166,6 +275,15 @@ def create_app():
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/admin/tests/<test_code>')
+    @require_admin
+    def admin_test_detail(test_code):
+        """Test details, answer key and per-question results"""
+        test = data_manager.get_test_detail(test_code)
+        if test is None:
+            return jsonify({'error': 'Test not found'}), 404
+        return jsonify(test)
+
     @app.route('/admin/tests/<test_code>/toggle', methods=['POST'])
     @require_admin
     def admin_test_toggle(test_code):
@@ -184,14 +302,62 @@ def create_app():
             return jsonify({'success': True})
         return jsonify({'error': 'Test not found'}), 404
 
+    @app.route('/admin/tests/<test_code>/rescore', methods=['POST'])
+    @require_admin
+    def admin_test_rescore(test_code):
+        """Re-grade stored results after an answer key correction"""
+        if not data_manager.get_test_by_code(test_code):
+            return jsonify({'error': 'Test not found'}), 404
+        changed = data_manager.rescore_test(test_code)
+        return jsonify({'success': True, 'rescored': changed})
+
     @app.route('/admin/results')
     @require_admin
     def admin_results():
         """Results viewing page"""
         test_code = request.args.get('test_code')
-        results = data_manager.get_results_by_test(test_code) if test_code else data_manager.get_all_results()
         tests = data_manager.get_all_tests()
-        return render_template('admin_results.html', results=results, tests=tests, selected_test=test_code)
+        # Rows are paged in by admin.js from /admin/api/results
+        summary = data_manager.get_test_summary(test_code) if test_code else None
+        return render_template('admin_results.html', tests=tests, selected_test=test_code, summary=summary,
+                               filters=request.args)
+
+    @app.route('/admin/api/results')
+    @require_admin
+    def admin_api_results():
+        """One page of results, filtered and ordered by submission time"""
+        args = request.args
+        try:
+            limit = int(args.get('limit', 50))
+            if not 1 <= limit <= RESULTS_PAGE_MAX:
+                raise ValueError(f'limit must be between 1 and {RESULTS_PAGE_MAX}')
+            order = args.get('order', 'desc')
+            if order not in ('asc', 'desc'):
+                raise ValueError('order must be asc or desc')
+            page = data_manager.query_results(
+                cursor=args.get('cursor') or None,
+                limit=limit,
+                test_code=args.get('test_code') or None,
+                user_id=int(args['user_id']) if args.get('user_id') else None,
+                user_name=args.get('search') or None,
+                min_score=float(args['min_score']) if args.get('min_score') else None,
+                max_score=float(args['max_score']) if args.get('max_score') else None,
+                date_from=args.get('date_from') or None,
+                date_to=args.get('date_to') or None,
+                descending=order == 'desc'
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(page)
+
+    @app.route('/admin/api/result/<result_id>')
+    @require_admin
+    def admin_api_result(result_id):
+        """One result with its answers marked against the answer key"""
+        result = data_manager.get_result_detail(result_id)
+        if result is None:
+            return jsonify({'error': 'Result not found'}), 404
+        return jsonify(result)
 
     @app.route('/admin/api/stats')
     @require_admin
@@ -200,12 +366,55 @@ def create_app():
         stats = data_manager.get_detailed_stats()
         return jsonify(stats)
 
+    @app.route('/admin/metrics')
+    @require_metrics_access
+    def admin_metrics():
+        """This worker's metrics in the Prometheus text format, every series labelled with its pid"""
+        return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/admin/metrics/slow')
+    @require_metrics_access
+    def admin_metrics_slow():
+        """This worker's slowest profiled requests with their hottest functions"""
+        return jsonify({
+            'pid': os.getpid(),
+            'enabled': request_profiler.enabled,
+            'sample_rate': request_profiler.sample_rate,
+            'requests': request_profiler.slowest()
+        })
+
+    @app.route('/admin/api/analytics/<test_code>')
+    @require_admin
+    def admin_api_analytics(test_code):
+        """Per-question analytics for a test"""
+        analytics = data_manager.get_test_analytics(test_code)
+        if analytics is None:
+            return jsonify({'error': 'Test not found'}), 404
+        return jsonify(analytics)
+
     @app.route('/admin/api/export/<test_code>')
     @require_admin
     def admin_api_export(test_code):
-        """Export test results"""
-        results = data_manager.get_results_by_test(test_code)
-        return jsonify(results)
+        """Stream test results as CSV or NDJSON"""
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+        try:
+            limit = int(request.args['limit']) if 'limit' in request.args else None
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if limit is not None and limit < 0:
+            return jsonify({'error': 'limit must not be negative'}), 400
+
+        test = data_manager.get_test_by_code(test_code)
+        if not test:
+            return jsonify({'error': 'Test not found'}), 404
+
+        results = data_manager.iter_results_by_test(test_code, since=request.args.get('since'), limit=limit)
+        return Response(export_results(test, results, data_manager.get_user, fmt),
+                        mimetype=EXPORT_FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename=test_{test_code}_results.{fmt}'})
 
     return app
 
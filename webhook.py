@@ -0,0 +1,132 @@
+"""
+Webhook Module
+Receives Telegram updates over HTTP and feeds them to the dispatcher
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import signal
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+# Public URL Telegram posts updates to, e.g. https://example.com/telegram/webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Shared secret Telegram echoes back in every request; generated per run if unset
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Updates processed at once; further requests wait, which throttles Telegram
+MAX_CONCURRENT_UPDATES = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "100"))
+# Seconds to let in-flight updates finish on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+# Telegram accepts 1-100 simultaneous webhook connections
+TELEGRAM_MAX_CONNECTIONS = 100
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """Webhook handler that acknowledges updates at once and processes a bounded number concurrently"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 max_concurrent: int = MAX_CONCURRENT_UPDATES, **data: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True,
+                         secret_token=secret_token, **data)
+        self.max_concurrent = max_concurrent
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        """Updates currently being processed"""
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            return web.Response(body="Unauthorized", status=401)
+
+        try:
+            update = await request.json(loads=self.bot.session.json_loads)
+        except ValueError:
+            return web.Response(body="Bad Request", status=400)
+
+        # Holding the request open while every slot is busy pushes back on Telegram
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({})
+
+    __call__ = handle
+
+    async def _process(self, update: Dict):
+        try:
+            result = await self.dispatcher.feed_raw_update(bot=self.bot, update=update, **self.data)
+            if isinstance(result, TelegramMethod):
+                await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+        except Exception as e:
+            logger.error(f"Error processing update {update.get('update_id')}: {e}")
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Let in-flight updates finish, then close the bot session"""
+        if self._tasks:
+            done, pending = await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        await super().close()
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, secret_token: str, path: str = WEBHOOK_PATH,
+                       max_concurrent: int = MAX_CONCURRENT_UPDATES) -> web.Application:
+    """aiohttp application serving the webhook endpoint"""
+    app = web.Application()
+    handler = LimitedRequestHandler(dispatcher, bot, secret_token=secret_token, max_concurrent=max_concurrent)
+    handler.register(app, path=path)
+    app['webhook_handler'] = handler
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, url: str = WEBHOOK_URL, host: str = WEBHOOK_HOST,
+                      port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH, secret_token: str = WEBHOOK_SECRET,
+                      max_concurrent: int = MAX_CONCURRENT_UPDATES):
+    """Register the webhook with Telegram and serve updates until SIGINT/SIGTERM"""
+    if not url:
+        raise ValueError("WEBHOOK_URL is required in webhook mode")
+    secret_token = secret_token or secrets.token_urlsafe(32)
+
+    app = create_webhook_app(dispatcher, bot, secret_token, path, max_concurrent)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    await bot.set_webhook(
+        url,
+        secret_token=secret_token,
+        max_connections=min(max_concurrent, TELEGRAM_MAX_CONNECTIONS),
+        allowed_updates=dispatcher.resolve_used_update_types()
+    )
+    logger.info(f"Webhook listening on {host}:{port}{path} for {url}")
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    try:
+        await stopped.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        logger.info("Stopping webhook server...")
+        await runner.cleanup()